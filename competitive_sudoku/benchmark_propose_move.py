@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import argparse
+import multiprocessing
+import time
+from competitive_sudoku.sudoku import Move
+from competitive_sudoku.sudokuai import BestMoveSlot, SudokuAI
+
+
+def propose_moves(player: SudokuAI, count: int, result) -> None:
+    """
+    Calls propose_move count times, and stores the elapsed time in result.
+    """
+    move = Move(1, 2, 3)
+    start = time.perf_counter()
+    for _ in range(count):
+        player.propose_move(move)
+    result.value = time.perf_counter() - start
+
+
+def measure(player: SudokuAI, count: int) -> float:
+    """
+    Measures the average latency of propose_move in a separate process, like in simulate_game.
+    @return: The latency in microseconds.
+    """
+    result = multiprocessing.Value('d', 0.0)
+    process = multiprocessing.Process(target=propose_moves, args=(player, count, result))
+    process.start()
+    process.join()
+    return result.value / count * 1e6
+
+
+def main():
+    cmdline_parser = argparse.ArgumentParser(description='Benchmark of the latency of SudokuAI.propose_move.')
+    cmdline_parser.add_argument('--count', type=int, help="the number of calls (default: 10000)", default=10000)
+    args = cmdline_parser.parse_args()
+
+    player = SudokuAI()
+    with multiprocessing.Manager() as manager:
+        player.lock = multiprocessing.Lock()
+        player.best_move = manager.list([0, 0, 0])
+        print(f'Manager().list with lock: {measure(player, args.count):8.2f} us per call')
+
+    player.lock = multiprocessing.Lock()
+    player.best_move = BestMoveSlot()
+    print(f'BestMoveSlot with lock:   {measure(player, args.count):8.2f} us per call')
+    assert list(player.best_move) == [1, 2, 3]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import argparse
+import copy
+import importlib
+import multiprocessing
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from competitive_sudoku.openingbook import position_key, write_opening_book
+from competitive_sudoku.oracle import has_solution, legal_moves
+from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, load_sudoku
+from competitive_sudoku.sudokuai import BestMoveSlot, SudokuAI
+from competitive_sudoku.symmetry import canonical_form
+
+
+def make_board(m: int, n: int, form: Tuple[int, ...]) -> SudokuBoard:
+    """
+    Creates a board from its squares.
+    """
+    board = SudokuBoard(m, n)
+    for k, value in enumerate(form):
+        if value != SudokuBoard.empty:
+            board.put(k // board.N, k % board.N, value)
+    return board
+
+
+def analyze(player: SudokuAI, board: SudokuBoard, calculation_time: float) -> Optional[Move]:
+    """
+    Computes the best move of a position with a deep search of the player, in a separate process like in
+    simulate_game.
+    @return: The last move that was proposed by the player, or None if no move was proposed.
+    """
+    game_state = GameState(board, copy.deepcopy(board), [], [], [0, 0])
+    player.lock = multiprocessing.Lock()
+    player.best_move = BestMoveSlot()
+    player.deadline = time.time() + calculation_time
+    process = multiprocessing.Process(target=player.compute_best_move, args=(game_state,))
+    process.start()
+    process.join(calculation_time)
+    player.lock.acquire()
+    process.terminate()
+    player.lock.release()
+    process.join()
+    i, j, value = player.best_move
+    if value == 0:
+        return None
+    return Move(i, j, value)
+
+
+def build_opening_book(board: SudokuBoard, player: SudokuAI, plies: int, calculation_time: float,
+                       max_positions: int) -> Dict[int, int]:
+    """
+    Builds an opening book, by analyzing all positions that can be reached from board in less than plies moves.
+    Symmetric positions are analyzed once, since the book is indexed by the canonical form of a position. Moves that
+    make the sudoku unsolvable are not followed.
+    @return: The entries of the book, see write_opening_book.
+    """
+    m, n, N = board.m, board.n, board.N
+    entries = {}
+    level = [canonical_form(board)]
+    for ply in range(plies):
+        print(f'Ply {ply}: {len(level)} positions')
+        next_level = set()
+        for form in level:
+            if len(entries) >= max_positions:
+                return entries
+            position = make_board(m, n, form)
+            move = analyze(player, position, calculation_time)
+            if move is None:
+                continue
+            entries[position_key(form, N)] = (move.i * N + move.j) * N + move.value - 1
+            print(f'{len(entries)}: {move}')
+            if ply + 1 == plies:
+                continue
+            for move in legal_moves(position):
+                position.put(move.i, move.j, move.value)
+                child = canonical_form(position)
+                if child not in next_level and has_solution(position):
+                    next_level.add(child)
+                position.put(move.i, move.j, SudokuBoard.empty)
+        level = sorted(next_level)
+    return entries
+
+
+def main():
+    cmdline_parser = argparse.ArgumentParser(description='Script for building an opening book of a start position.')
+    cmdline_parser.add_argument('--board', metavar='FILE', type=str, help='a text file containing the start position',
+                                required=True)
+    cmdline_parser.add_argument('--player', help="the module name of the SudokuAI class that analyzes the positions "
+                                                 "(default: team36_A2_taboo)", default='team36_A2_taboo')
+    cmdline_parser.add_argument('--plies', type=int, help="the positions after less than this number of moves are "
+                                                         "stored (default: 3)", default=3)
+    cmdline_parser.add_argument('--time', type=float, help="the time (in seconds) for analyzing a position "
+                                                          "(default: 10)", default=10)
+    cmdline_parser.add_argument('--max-positions', type=int, help="the maximum number of positions (default: 1000)",
+                                default=1000)
+    cmdline_parser.add_argument('--output', metavar='FILE', type=str,
+                                help="the opening book file (default: team36_A2_book/books/<name of the board>.book)")
+    args = cmdline_parser.parse_args()
+
+    board = load_sudoku(args.board)
+    player = importlib.import_module(args.player + '.sudokuai').SudokuAI()
+    output = Path(args.output) if args.output else Path('team36_A2_book') / 'books' / (Path(args.board).stem + '.book')
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    entries = build_opening_book(board, player, args.plies, args.time, args.max_positions)
+    write_opening_book(str(output), board.m, board.n, entries)
+    print(f'Wrote {len(entries)} positions to {output} in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
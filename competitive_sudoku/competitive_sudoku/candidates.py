@@ -0,0 +1,156 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Iterable
+from competitive_sudoku.peers import peer_table
+
+# Squares are numbered k = i * N + j, and moves are encoded as k * N + value - 1, as in competitive_sudoku.movelist.
+
+
+class CandidateTracker(object):
+    """
+    Keeps track of the candidate values of every empty square while moves are played and undone during a search. The
+    candidates of a square are the values of the remaining moves in that square, stored as a bitmask with bit
+    value - 1 set. The number of empty squares without candidates is maintained as well, such that a dead end can be
+    detected in constant time. Playing and undoing a move takes time proportional to the number of peers of the
+    square.
+    """
+
+    def __init__(self, m: int, n: int, moves: Iterable[int], empty_squares: Iterable[int]):
+        """
+        Constructs the tracker.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param moves: The codes of the moves that can still be played.
+        @param empty_squares: The indices k = i * N + j of the empty squares.
+        """
+        self.peers = peer_table(m, n)
+        N = m * n
+        self.N = N
+        self.masks = [0] * (N * N)
+        for code in moves:
+            self.masks[code // N] |= 1 << (code % N)
+        self.zero_count = sum(1 for k in empty_squares if self.masks[k] == 0)
+        self._trail = []  # the pairs (k, mask) that are needed to undo moves
+        self._marks = []  # for every played move, the length of the trail and the zero count before it, and its code
+
+    def push(self, code: int) -> None:
+        """
+        Plays the move with the given code: its square is filled, and its value is removed from the candidates of
+        the peers.
+        @param code: The code of a move with a candidate value in an empty square.
+        """
+        N = self.N
+        k = code // N
+        bit = 1 << (code % N)
+        masks = self.masks
+        trail = self._trail
+        self._marks.append((len(trail), self.zero_count, code))
+        trail.append((k, masks[k]))
+        masks[k] = 0
+        for p in self.peers.peers[k]:
+            mask = masks[p]
+            if mask & bit:
+                trail.append((p, mask))
+                masks[p] = mask ^ bit
+                if mask == bit:
+                    self.zero_count += 1
+
+    def pop(self) -> None:
+        """
+        Undoes the last move that was played using push.
+        """
+        length, self.zero_count, _ = self._marks.pop()
+        masks = self.masks
+        trail = self._trail
+        while len(trail) > length:
+            k, mask = trail.pop()
+            masks[k] = mask
+
+    def count(self, k: int) -> int:
+        """
+        @return: The number of candidates of square k.
+        """
+        return bin(self.masks[k]).count('1')
+
+    def unsolvable(self, propagate: bool = False) -> bool:
+        """
+        Checks if some empty square has no candidates left. If propagate is True, the consequences of the last move
+        are propagated as well: naked singles (a square with one candidate) and hidden singles (a value with one
+        possible square in a row, column or block) are filled in, until a contradiction is found or nothing changes.
+        The propagated moves are undone before returning.
+        @param propagate: If True, singles are propagated.
+        @return: True if the remaining moves cannot complete the sudoku. False means that no contradiction was found.
+        """
+        if self.zero_count:
+            return True
+        if not propagate or not self._marks:
+            return False
+        depth = len(self._marks)
+        try:
+            return self._propagate(depth - 1)
+        finally:
+            while len(self._marks) > depth:
+                self.pop()
+
+    def _propagate(self, index: int) -> bool:
+        """
+        Propagates the moves starting from self._marks[index]. Only the squares that lost a candidate are examined,
+        together with the regions in which that value can no longer be put in the square.
+        @return: True if a contradiction was found.
+        """
+        N = self.N
+        masks = self.masks
+        trail = self._trail
+        marks = self._marks
+        regions = self.peers.regions
+        square_regions = self.peers.square_regions
+
+        # The values that have been put in every region by the propagated moves
+        placed = [0] * len(regions)
+
+        def play(code: int) -> bool:
+            self.push(code)
+            bit = 1 << (code % N)
+            for r in square_regions[code // N]:
+                placed[r] |= bit
+            return self.zero_count > 0
+
+        for r in square_regions[marks[index][2] // N]:
+            placed[r] |= 1 << (marks[index][2] % N)
+
+        while index < len(marks):
+            start, _, code = marks[index]
+            end = marks[index + 1][0] if index + 1 < len(marks) else len(trail)
+            value = code % N
+            bit = 1 << value
+            for t in range(start + 1, end):
+                p = trail[t][0]
+                mask = masks[p]
+                if not mask:
+                    # The square has been filled in by a single
+                    continue
+                if not mask & (mask - 1):
+                    # Naked single
+                    if play(p * N + mask.bit_length() - 1):
+                        return True
+                    continue
+                for r in square_regions[p]:
+                    if placed[r] & bit:
+                        continue
+                    # The value is still missing in this region, and it has one possible square less
+                    square = -1
+                    for q in regions[r]:
+                        if masks[q] & bit:
+                            if square >= 0:
+                                break
+                            square = q
+                    else:
+                        if square < 0:
+                            return True
+                        # Hidden single
+                        if play(square * N + value):
+                            return True
+            index += 1
+        return False
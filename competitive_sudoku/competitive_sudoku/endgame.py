@@ -0,0 +1,169 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from competitive_sudoku.oracle import find_solutions
+from competitive_sudoku.peers import peer_table
+from competitive_sudoku.sudoku import BitSudokuBoard, GameState, Move, SudokuBoard, move_table, taboo_keys, \
+    zobrist_keys
+
+# Moves are encoded as (i * N + j) * N + value - 1, as in competitive_sudoku.movelist.
+
+
+class _OutOfTime(Exception):
+    """
+    Stops a search of the EndgameSolver when its deadline has passed.
+    """
+
+
+class EndgameSolver(object):
+    """
+    Computes the exact game value of positions with few empty squares. The game is searched until the board is full,
+    using the fact that a move keeps the sudoku solvable if and only if it agrees with one of its solutions. So the
+    solutions are enumerated once, and the moves of a position are read off from the solutions that are still
+    possible. Besides these moves a player can pass the turn by playing a move that makes the sudoku unsolvable,
+    after which that move is taboo. The results are memoized on the Zobrist hash of the board and of the taboo moves
+    that can still be played, because the other taboo moves do not influence the rest of the game. Since every search
+    is complete, the memo only contains exact values, and transpositions and later turns are answered from it. This
+    also holds for a search that is stopped at its deadline, since only the positions that were searched completely
+    are in the memo.
+    """
+
+    def __init__(self, max_solutions: int = 1000, max_entries: int = 1 << 20):
+        """
+        @param max_solutions: If a position has more solutions, it is not solved.
+        @param max_entries: The maximum size of the memo. It is cleared when it is full.
+        """
+        self.max_solutions = max_solutions
+        self.max_entries = max_entries
+        self.memo: Dict[int, Tuple[int, Optional[int]]] = {}  # key -> (value, code of the best move)
+        self.nodes = 0
+        self.deadline = None
+
+    def solve(self, board: SudokuBoard, taboo_moves: Iterable[Move] = (), deadline: Optional[float] = None) \
+            -> Optional[Tuple[int, Move]]:
+        """
+        Solves a position.
+        @param board: A sudoku board with a solution.
+        @param taboo_moves: The taboo moves of the game.
+        @param deadline: The time (as returned by time.time) at which the search is given up, or None.
+        @return: The score difference that the player to move achieves with perfect play until the end of the game,
+        and a move that achieves it. None if the board is full, has no solution or has too many solutions, or if the
+        deadline has passed.
+        """
+        board = BitSudokuBoard.from_board(board)
+        N = board.N
+        solutions = find_solutions(board, self.max_solutions)
+        if not solutions:
+            return None
+        empty_squares = [k for k, value in enumerate(board.squares) if value == SudokuBoard.empty]
+        if not empty_squares:
+            return None
+        if len(self.memo) > self.max_entries:
+            self.memo.clear()
+        # Only the taboo moves that are still legal influence the game
+        keys = taboo_keys(N)
+        key = board.hash
+        taboo = []
+        for move in taboo_moves:
+            code = (move.i * N + move.j) * N + move.value - 1
+            if board.get(move.i, move.j) == SudokuBoard.empty and board.candidates(move.i, move.j) >> (code % N) & 1 \
+                    and code not in taboo:
+                taboo.append(code)
+                key ^= keys[code]
+        self.deadline = deadline
+        try:
+            value, code = self._negamax(board, key, empty_squares, solutions, taboo)
+        except _OutOfTime:
+            return None
+        return value, move_table(N)[code]
+
+    def _negamax(self, board: BitSudokuBoard, key: int, empty_squares: List[int], solutions: List[List[int]],
+                 taboo: List[int]) -> Tuple[int, Optional[int]]:
+        """
+        Searches the remaining game.
+        @param board: The board, it is restored before returning.
+        @param key: The key of the position.
+        @param empty_squares: The empty squares of the board, in increasing order.
+        @param solutions: The solutions of the board.
+        @param taboo: The codes of the taboo moves that are legal on the board.
+        @return: The value of the position for the player to move, and the code of the best move.
+        """
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+        if not empty_squares:
+            return 0, None
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 63 and time.time() > self.deadline:
+            raise _OutOfTime()
+        N = board.N
+        memo = self.memo
+        zobrist = zobrist_keys(N)
+        conflicts = peer_table(board.m, board.n).conflicts
+
+        # The moves that keep the sudoku solvable, with the solutions that remain after them
+        moves = {}
+        for solution in solutions:
+            for k in empty_squares:
+                code = k * N + solution[k] - 1
+                if code in moves:
+                    moves[code].append(solution)
+                else:
+                    moves[code] = [solution]
+
+        best_value = None
+        best_code = None
+        for code, remaining in moves.items():
+            k = code // N
+            i, j = divmod(k, N)
+            empty_row, empty_column, empty_block = board.region_empty_counts(i, j)
+            reward = GameState.region_scores[(empty_row == 1) + (empty_column == 1) + (empty_block == 1)]
+
+            # The taboo moves that become illegal leave the key, the results of transpositions are looked up
+            # before the move is played
+            child_key = key ^ zobrist[code]
+            child_taboo = taboo
+            if taboo:
+                child_taboo = []
+                for t in taboo:
+                    if t in conflicts[code]:
+                        child_key ^= taboo_keys(N)[t]
+                    else:
+                        child_taboo.append(t)
+            result = memo.get(child_key)
+            if result is None:
+                board.put(i, j, code % N + 1)
+                result = self._negamax(board, child_key, [s for s in empty_squares if s != k], remaining, child_taboo)
+                board.put(i, j, SudokuBoard.empty)
+            value = reward - result[0]
+            if best_value is None or value > best_value:
+                best_value, best_code = value, code
+
+        # Pass the turn with a move that makes the sudoku unsolvable
+        for pass_code in self._passes(board, empty_squares, moves, taboo):
+            value = -self._negamax(board, key ^ taboo_keys(N)[pass_code], empty_squares, solutions,
+                                   taboo + [pass_code])[0]
+            if value > best_value:
+                best_value, best_code = value, pass_code
+
+        result = (best_value, best_code)
+        memo[key] = result
+        return result
+
+    @staticmethod
+    def _passes(board: BitSudokuBoard, empty_squares: List[int], moves, taboo: List[int]) -> Iterator[int]:
+        """
+        @return: The codes of the legal moves that make the sudoku unsolvable and that are not taboo.
+        """
+        N = board.N
+        for k in empty_squares:
+            mask = board.candidates(k // N, k % N)
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                code = k * N + bit.bit_length() - 1
+                if code not in moves and code not in taboo:
+                    yield code
@@ -3,8 +3,9 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import os
-from pathlib import Path
 import tempfile
+from typing import Optional
+from competitive_sudoku import oracle
 
 
 def execute_command(command: str) -> str:
@@ -16,17 +17,23 @@ def execute_command(command: str) -> str:
     return output.decode("utf-8").strip()
 
 
-def solve_sudoku(solve_sudoku_path: str, board_text: str, options: str='') -> str:
+def solve_sudoku(solve_sudoku_path: Optional[str], board_text: str, options: str='') -> str:
     """
     Execute the solve_sudoku program.
-    @param solve_sudoku_path: The location of the solve_sudoku executable.
+    @param solve_sudoku_path: The location of the solve_sudoku executable. If it is None, the in-process oracle in
+    competitive_sudoku.oracle is used instead.
     @param board_text: A string representation of a sudoku board.
     @param options: Additional command line options.
     @return: The output of solve_sudoku.
     """
+    if solve_sudoku_path is None:
+        return oracle.solve_sudoku(board_text, options)
     if not os.path.exists(solve_sudoku_path):
         raise RuntimeError(f'No oracle found at location "{solve_sudoku_path}"')
-    filename = tempfile.NamedTemporaryFile(prefix='solve_sudoku_').name
-    Path(filename).write_text(board_text)
-    command = f'{solve_sudoku_path} {filename} {options}'
-    return execute_command(command)
+    with tempfile.NamedTemporaryFile('w', prefix='solve_sudoku_', delete=False) as file:
+        file.write(board_text)
+    try:
+        command = f'{solve_sudoku_path} {file.name} {options}'
+        return execute_command(command)
+    finally:
+        os.remove(file.name)
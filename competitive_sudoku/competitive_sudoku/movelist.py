@@ -0,0 +1,177 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from array import array
+from typing import Iterable, Iterator, List, Set
+from competitive_sudoku.sudoku import Move, move_table
+
+# A move (i, j, value) on a board with N * N squares is encoded as the integer k * N + value - 1, with k = i * N + j
+# the index of the square. This is also the index of the move in move_table(N) and of its key in zobrist_keys(N).
+
+
+def encode_move(move: Move, N: int) -> int:
+    """
+    Encodes a move as an integer.
+    @param move: A move.
+    @param N: The number of values of the board.
+    @return: The code (i * N + j) * N + value - 1 of the move.
+    """
+    return (move.i * N + move.j) * N + move.value - 1
+
+
+def decode_move(code: int, N: int) -> Move:
+    """
+    Decodes an integer into a move. The move is taken from the interned moves, so no object is allocated.
+    @param code: The code of a move.
+    @param N: The number of values of the board.
+    @return: The move with the given code.
+    """
+    return move_table(N)[code]
+
+
+def code_square(code: int, N: int) -> int:
+    """
+    @return: The index k = i * N + j of the square of the move with the given code.
+    """
+    return code // N
+
+
+def code_value(code: int, N: int) -> int:
+    """
+    @return: The value of the move with the given code.
+    """
+    return code % N + 1
+
+
+class MoveList(object):
+    """
+    A compact list of encoded moves for boards with blocks of size m x n. The codes are stored in an array of unsigned
+    shorts (or unsigned ints for boards with more than 40 values), such that copying a list is a memory copy and no
+    Move objects need to be created during a search. Moves are converted back to Move objects using to_move, for
+    example right before propose_move.
+    """
+
+    __slots__ = ('m', 'n', 'N', 'codes')
+
+    def __init__(self, m: int, n: int, codes: Iterable[int] = ()):
+        """
+        Constructs a move list.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param codes: The codes of the moves.
+        """
+        N = m * n
+        self.m = m
+        self.n = n
+        self.N = N
+        self.codes = array('H' if N * N * N <= 1 << 16 else 'I', codes)
+
+    @staticmethod
+    def from_moves(m: int, n: int, moves: Iterable[Move]) -> 'MoveList':
+        """
+        Creates a move list from Move objects.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param moves: The moves.
+        @return: The encoded moves.
+        """
+        N = m * n
+        return MoveList(m, n, ((move.i * N + move.j) * N + move.value - 1 for move in moves))
+
+    def _create(self, codes: Iterable[int]) -> 'MoveList':
+        return MoveList(self.m, self.n, codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.codes)
+
+    def __getitem__(self, index: int) -> int:
+        return self.codes[index]
+
+    def __contains__(self, code: int) -> bool:
+        return code in self.codes
+
+    def __eq__(self, other):
+        if not isinstance(other, MoveList):
+            return NotImplemented
+        return self.N == other.N and self.codes == other.codes
+
+    def __str__(self):
+        return '[' + ', '.join(str(move) for move in self.to_moves()) + ']'
+
+    def append(self, code: int) -> None:
+        self.codes.append(code)
+
+    def copy(self) -> 'MoveList':
+        result = MoveList.__new__(MoveList)
+        result.m, result.n, result.N = self.m, self.n, self.N
+        result.codes = array(self.codes.typecode, self.codes)
+        return result
+
+    def to_move(self, index: int) -> Move:
+        """
+        @return: The move at position index, as a Move object.
+        """
+        return move_table(self.N)[self.codes[index]]
+
+    def to_moves(self) -> List[Move]:
+        """
+        @return: The moves as a list of Move objects.
+        """
+        moves = move_table(self.N)
+        return [moves[code] for code in self.codes]
+
+    def squares(self) -> Set[int]:
+        """
+        @return: The indices k = i * N + j of the squares that have at least one move.
+        """
+        N = self.N
+        return set(code // N for code in self.codes)
+
+    def in_square(self, i: int, j: int) -> 'MoveList':
+        """
+        @return: The moves in square (i, j).
+        """
+        N = self.N
+        k = i * N + j
+        return self._create(code for code in self.codes if code // N == k)
+
+    def without_square(self, i: int, j: int) -> 'MoveList':
+        """
+        @return: The moves that are not in square (i, j).
+        """
+        N = self.N
+        k = i * N + j
+        return self._create(code for code in self.codes if code // N != k)
+
+    def in_row(self, i: int) -> 'MoveList':
+        """
+        @return: The moves in row i.
+        """
+        NN = self.N * self.N
+        return self._create(code for code in self.codes if code // NN == i)
+
+    def in_column(self, j: int) -> 'MoveList':
+        """
+        @return: The moves in column j.
+        """
+        N = self.N
+        return self._create(code for code in self.codes if code // N % N == j)
+
+    def in_block(self, b: int) -> 'MoveList':
+        """
+        @return: The moves in block b, where blocks are numbered row by row as in SudokuBoard.block_index.
+        """
+        m, n, N = self.m, self.n, self.N
+        NN = N * N
+        return self._create(code for code in self.codes if code // NN // m * m + code // N % N // n == b)
+
+    def with_value(self, value: int) -> 'MoveList':
+        """
+        @return: The moves that put value in a square.
+        """
+        N = self.N
+        return self._create(code for code in self.codes if code % N == value - 1)
@@ -0,0 +1,102 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import mmap
+import struct
+from typing import Dict, Optional, Tuple
+from competitive_sudoku.sudoku import Move, SudokuBoard, zobrist_keys
+from competitive_sudoku.symmetry import canonical_symmetry
+
+# An opening book file starts with a header (magic, m, n, number of entries), followed by the entries
+# (key, code) sorted by key. The key is the Zobrist hash of the canonical form of a position, and the code
+# (i * N + j) * N + value - 1 is the best move in the canonical form. All numbers are little endian.
+BOOK_MAGIC = b'SDKBOOK1'
+_HEADER = struct.Struct('<8sHHI')
+_ENTRY = struct.Struct('<QH')
+
+
+def position_key(form: Tuple[int, ...], N: int) -> int:
+    """
+    Computes the key of a position in an opening book.
+    @param form: The canonical form of a board, as computed by canonical_form.
+    @param N: The number of values of the board.
+    @return: The Zobrist hash of the canonical board.
+    """
+    keys = zobrist_keys(N)
+    key = 0
+    for k, value in enumerate(form):
+        if value != SudokuBoard.empty:
+            key ^= keys[k * N + value - 1]
+    return key
+
+
+def write_opening_book(filename: str, m: int, n: int, entries: Dict[int, int]) -> None:
+    """
+    Writes an opening book.
+    @param filename: The name of the file.
+    @param m: The number of rows in a block.
+    @param n: The number of columns in a block.
+    @param entries: The code of the best move in canonical coordinates, indexed by the key of the position.
+    """
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(BOOK_MAGIC, m, n, len(entries)))
+        for key in sorted(entries):
+            f.write(_ENTRY.pack(key, entries[key]))
+
+
+class OpeningBook(object):
+    """
+    An opening book on disk, built with build_opening_book.py. The file is memory mapped, and a position is looked
+    up with a binary search on its key, so only the pages that are touched are read. Symmetric positions share an
+    entry: the best move is stored for the canonical form, and it is mapped back to the position that is looked up.
+    """
+
+    def __init__(self, filename: str):
+        """
+        Opens an opening book.
+        @param filename: The name of the file.
+        """
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.m, self.n, self.size = _HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or len(self.data) != _HEADER.size + self.size * _ENTRY.size:
+            self.data.close()
+            raise RuntimeError(f'The file {filename} is not an opening book.')
+
+    def close(self) -> None:
+        self.data.close()
+
+    def find(self, key: int) -> Optional[int]:
+        """
+        @param key: The key of a position.
+        @return: The code of the best move in the canonical form of the position, or None if it is not in the book.
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, code = _ENTRY.unpack_from(self.data, _HEADER.size + middle * _ENTRY.size)
+            if entry_key == key:
+                return code
+            if entry_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup(self, board: SudokuBoard) -> Optional[Move]:
+        """
+        Looks up the best move of a position.
+        @param board: A sudoku board.
+        @return: The best move, or None if the position is not in the book.
+        """
+        if board.m != self.m or board.n != self.n:
+            return None
+        N = board.N
+        form, symmetry = canonical_symmetry(board)
+        code = self.find(position_key(form, N))
+        if code is None:
+            return None
+        k, value = divmod(code, N)
+        i, j, value = symmetry.invert(k // N, k % N, value + 1)
+        return Move(i, j, value)
@@ -0,0 +1,272 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import random
+import shlex
+from typing import Iterable, List, Optional
+from competitive_sudoku.sudoku import BitSudokuBoard, GameState, Move, SudokuBoard, load_sudoku_from_text, \
+    mask_values, move_table
+
+
+def has_solution(board: SudokuBoard) -> bool:
+    """
+    Checks if a sudoku board can be completed, using a backtracking search that always branches on the empty square
+    with the fewest candidates.
+    @param board: A sudoku board.
+    @return: True if the board has a solution.
+    """
+    m = board.m
+    n = board.n
+    N = board.N
+    full_mask = (1 << N) - 1
+    rows = [0] * N
+    columns = [0] * N
+    blocks = [0] * N
+    empty_squares = []
+    for k, value in enumerate(board.squares):
+        i, j = divmod(k, N)
+        b = (i // m) * m + j // n
+        if value == SudokuBoard.empty:
+            empty_squares.append((i, j, b))
+            continue
+        bit = 1 << (value - 1)
+        if (rows[i] | columns[j] | blocks[b]) & bit:
+            return False
+        rows[i] |= bit
+        columns[j] |= bit
+        blocks[b] |= bit
+
+    def search(remaining: int) -> bool:
+        if remaining == 0:
+            return True
+
+        # Select the empty square with the fewest candidates
+        best_index = -1
+        best_mask = 0
+        best_count = N + 1
+        for index in range(remaining):
+            i, j, b = empty_squares[index]
+            mask = full_mask & ~(rows[i] | columns[j] | blocks[b])
+            count = bin(mask).count('1')
+            if count < best_count:
+                best_index, best_mask, best_count = index, mask, count
+                if count <= 1:
+                    break
+        if best_count == 0:
+            return False
+
+        # Move the selected square to the end of the unfilled part of the list
+        last = remaining - 1
+        empty_squares[best_index], empty_squares[last] = empty_squares[last], empty_squares[best_index]
+        i, j, b = empty_squares[last]
+        mask = best_mask
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            rows[i] |= bit
+            columns[j] |= bit
+            blocks[b] |= bit
+            solved = search(last)
+            rows[i] ^= bit
+            columns[j] ^= bit
+            blocks[b] ^= bit
+            if solved:
+                return True
+        return False
+
+    return search(len(empty_squares))
+
+
+def find_solutions(board: SudokuBoard, limit: int) -> Optional[List[List[int]]]:
+    """
+    Computes all the completions of a sudoku board, using the same backtracking search as has_solution.
+    @param board: A sudoku board.
+    @param limit: The maximum number of solutions.
+    @return: The squares of the solutions, or None if there are more than limit solutions.
+    """
+    m = board.m
+    n = board.n
+    N = board.N
+    full_mask = (1 << N) - 1
+    rows = [0] * N
+    columns = [0] * N
+    blocks = [0] * N
+    squares = list(board.squares)
+    empty_squares = []
+    for k, value in enumerate(squares):
+        i, j = divmod(k, N)
+        b = (i // m) * m + j // n
+        if value == SudokuBoard.empty:
+            empty_squares.append((k, i, j, b))
+            continue
+        bit = 1 << (value - 1)
+        if (rows[i] | columns[j] | blocks[b]) & bit:
+            return []
+        rows[i] |= bit
+        columns[j] |= bit
+        blocks[b] |= bit
+    solutions = []
+
+    def search(remaining: int) -> bool:
+        if remaining == 0:
+            solutions.append(squares[:])
+            return len(solutions) <= limit
+
+        # Select the empty square with the fewest candidates
+        best_index = -1
+        best_mask = 0
+        best_count = N + 1
+        for index in range(remaining):
+            _, i, j, b = empty_squares[index]
+            mask = full_mask & ~(rows[i] | columns[j] | blocks[b])
+            count = bin(mask).count('1')
+            if count < best_count:
+                best_index, best_mask, best_count = index, mask, count
+                if count <= 1:
+                    break
+        if best_count == 0:
+            return True
+
+        last = remaining - 1
+        empty_squares[best_index], empty_squares[last] = empty_squares[last], empty_squares[best_index]
+        k, i, j, b = empty_squares[last]
+        mask = best_mask
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            rows[i] |= bit
+            columns[j] |= bit
+            blocks[b] |= bit
+            squares[k] = bit.bit_length()
+            going = search(last)
+            rows[i] ^= bit
+            columns[j] ^= bit
+            blocks[b] ^= bit
+            if not going:
+                return False
+        squares[k] = SudokuBoard.empty
+        return True
+
+    return solutions if search(len(empty_squares)) else None
+
+
+def legal_moves(board: SudokuBoard, taboo_moves: Iterable[Move] = ()) -> List[Move]:
+    """
+    Generates the moves that do not violate the constraints of the sudoku, and that are not taboo.
+    @param board: A sudoku board.
+    @param taboo_moves: Moves that may not be played.
+    @return: The list of legal moves.
+    """
+    taboo = set(taboo_moves)
+    N = board.N
+    table = move_table(N)
+    moves = []
+    for k, value in enumerate(board.squares):
+        if value != SudokuBoard.empty:
+            continue
+        i, j = divmod(k, N)
+        for value in mask_values(board.candidates(i, j)):
+            move = table[k * N + value - 1]
+            if move not in taboo:
+                moves.append(move)
+    return moves
+
+
+def score_move(board: SudokuBoard, move: Move) -> int:
+    """
+    Computes the reward of a move, based on the number of regions (row, column and block) that it completes.
+    @param board: A sudoku board.
+    @param move: A move on an empty square of board.
+    @return: The reward of the move.
+    """
+    empty_row, empty_column, empty_block = board.region_empty_counts(move.i, move.j)
+    return GameState.region_scores[(empty_row == 1) + (empty_column == 1) + (empty_block == 1)]
+
+
+def random_move(board: SudokuBoard, taboo_moves: Iterable[Move] = ()) -> Optional[Move]:
+    """
+    Generates a random legal move.
+    @param board: A sudoku board.
+    @param taboo_moves: Moves that may not be played.
+    @return: A legal move, or None if there are no legal moves.
+    """
+    moves = legal_moves(board, taboo_moves)
+    return random.choice(moves) if moves else None
+
+
+def greedy_move(board: SudokuBoard, taboo_moves: Iterable[Move] = ()) -> Optional[Move]:
+    """
+    Generates a random legal move among the moves with the highest reward.
+    @param board: A sudoku board.
+    @param taboo_moves: Moves that may not be played.
+    @return: A legal move, or None if there are no legal moves.
+    """
+    board = BitSudokuBoard.from_board(board)
+    moves = legal_moves(board, taboo_moves)
+    if not moves:
+        return None
+    scores = [score_move(board, move) for move in moves]
+    best_score = max(scores)
+    return random.choice([move for move, score in zip(moves, scores) if score == best_score])
+
+
+def _parse_taboo_moves(text: str) -> List[Move]:
+    numbers = [int(word) for word in text.split()]
+    return [Move(numbers[k], numbers[k + 1], numbers[k + 2]) for k in range(0, len(numbers) - 2, 3)]
+
+
+def solve_sudoku(board_text: str, options: str = '') -> str:
+    """
+    An in-process replacement of the solve_sudoku program. It accepts the same board text and command line options
+    (--move, --random, --greedy and --taboo), and it produces the same messages.
+    @param board_text: A string representation of a sudoku board.
+    @param options: Additional command line options.
+    @return: The output that solve_sudoku would give.
+    """
+    board = load_sudoku_from_text(board_text)
+    N = board.N
+    move_text = None
+    mode = None
+    taboo_moves = []
+    words = shlex.split(options)
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if word == '--move':
+            index += 1
+            move_text = words[index]
+        elif word.startswith('--move='):
+            move_text = word[len('--move='):]
+        elif word in ('--random', '--greedy'):
+            mode = word[2:]
+        elif word == '--taboo':
+            index += 1
+            taboo_moves = _parse_taboo_moves(words[index])
+        elif word.startswith('--taboo='):
+            taboo_moves = _parse_taboo_moves(word[len('--taboo='):])
+        index += 1
+
+    if mode is not None:
+        move = random_move(board, taboo_moves) if mode == 'random' else greedy_move(board, taboo_moves)
+        if move is None:
+            return f'Error: could not find a {"legal" if mode == "random" else "greedy"} move.'
+        return f'Generated move ({board.rc2f(move.i, move.j)},{move.value})'
+
+    if move_text is not None:
+        try:
+            k, value = (int(word) for word in move_text.split())
+        except ValueError:
+            return f"Could not parse a move from '{move_text}'"
+        if not (0 <= k < N * N and 1 <= value <= N) or board.squares[k] != SudokuBoard.empty:
+            return f"Invalid move '{move_text}'"
+        i, j = board.f2rc(k)
+        if not board.candidates(i, j) & (1 << (value - 1)):
+            return f"Illegal move '{move_text}'"
+        score = score_move(board, Move(i, j, value))
+        board.put(i, j, value)
+        if not has_solution(board):
+            return f"The sudoku has no solution after move '{move_text}'."
+        return f"The score is {score} (valid move '{move_text}')."
+
+    return 'The sudoku has a solution.' if has_solution(board) else 'The sudoku has no solution.'
@@ -0,0 +1,75 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Any, Callable, Iterable, List, Optional
+
+
+class MoveOrdering(object):
+    """
+    Orders the moves of the interior nodes of an alpha-beta search with killer moves and the history heuristic.
+    When a move causes a cutoff, it becomes a killer move of its ply, and its history score is increased by the
+    square of the remaining depth. The killer moves of a ply are tried first in its other nodes, followed by the
+    other moves with the highest history score. The history is indexed by the code (i * N + j) * N + value - 1 of a
+    move, so it is shared by all positions where the same value is put in the same square.
+    """
+
+    def __init__(self, N: int, max_ply: int = 64, killer_slots: int = 2, encode: Optional[Callable[[Any], int]] = None):
+        """
+        Constructs an empty move ordering.
+        @param N: The number of values of the board.
+        @param max_ply: The maximum distance from the root of a node that has killer moves.
+        @param killer_slots: The number of killer moves per ply.
+        @param encode: Computes the code of a move. By default moves are codes.
+        """
+        self.N = N
+        self.encode = encode
+        self.history = [0] * (N * N * N)
+        self.killers = [[None] * killer_slots for _ in range(max_ply)]
+
+    def new_search(self) -> None:
+        """
+        Prepares the ordering for the search of a new move. The killer moves are forgotten, since the plies of the
+        previous search are not the plies of the new one, and the history scores are halved.
+        """
+        for slots in self.killers:
+            slots[:] = [None] * len(slots)
+        self.history = [score >> 1 for score in self.history]
+
+    def cutoff(self, move, ply: int, depth: int) -> None:
+        """
+        Records a move that caused a cutoff.
+        @param move: The move.
+        @param ply: The distance of the node from the root.
+        @param depth: The remaining depth of the search in the node.
+        """
+        if ply < len(self.killers):
+            slots = self.killers[ply]
+            if slots[0] != move:
+                slots.pop()
+                slots.insert(0, move)
+        self.history[move if self.encode is None else self.encode(move)] += depth * depth
+
+    def order(self, moves: Iterable, ply: int, first=None) -> List:
+        """
+        Orders the moves of a node.
+        @param moves: The moves of the node.
+        @param ply: The distance of the node from the root.
+        @param first: A move that is searched first if it is one of the moves, like the move of a transposition table
+        entry.
+        @return: first, the killer moves of the ply, and the other moves by decreasing history score. Moves with the
+        same history score keep their order.
+        """
+        history = self.history
+        encode = self.encode
+        if encode is None:
+            ordered = sorted(moves, key=history.__getitem__, reverse=True)
+        else:
+            ordered = sorted(moves, key=lambda move: history[encode(move)], reverse=True)
+        front = [] if first is None else [first]
+        if ply < len(self.killers):
+            front += [killer for killer in self.killers[ply] if killer is not None and killer != first]
+        if front:
+            front = [move for move in front if move in ordered]
+            ordered = front + [move for move in ordered if move not in front]
+        return ordered
@@ -0,0 +1,121 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import multiprocessing
+import os
+import queue
+import signal
+from typing import Any, Callable, List, Optional, Sequence
+
+
+def fork_available() -> bool:
+    """
+    @return: True if worker processes can be forked. A WorkerPool needs this, since the function of the workers is
+    usually a closure over the state of a search, which cannot be pickled.
+    """
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _run_worker(function: Callable, tasks, results, parent_pid: int) -> None:
+    """
+    The main loop of a worker of a WorkerPool. It receives tasks (number, argument) and answers them with
+    (number, result), or (number, exception) if the function raised one. Tasks without a number are not answered.
+    A task None stops the worker, and the worker stops by itself when its parent has died.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        try:
+            task = tasks.get(timeout=0.1)
+        except queue.Empty:
+            if os.getppid() != parent_pid:
+                break
+            continue
+        if task is None:
+            break
+        number, argument = task
+        try:
+            result = function(argument)
+        except Exception as err:
+            result = err
+        if number is not None:
+            results.put((number, result))
+
+
+class WorkerPool(object):
+    """
+    A pool of forked processes that apply a function to tasks. The workers are copies of the process that creates
+    the pool, so the function can use all the state of a search, like the game state and the transposition table.
+    Every worker keeps its own copy of that state, and it is not sent back.
+
+    A player is killed when its calculation time is over. The pool terminates its workers when the process that
+    created it receives SIGTERM, such that no orphaned workers keep searching during the next move.
+    """
+
+    def __init__(self, function: Callable[[Any], Any], workers: int, on_close: Optional[Callable[[], None]] = None):
+        """
+        Starts the workers.
+        @param function: The function that is applied to the tasks. It must not modify state that is used by
+        other tasks, unless that is intended.
+        @param workers: The number of worker processes.
+        @param on_close: A function that is called after the workers are stopped, also when the process is terminated.
+        It can release resources that are shared with the workers, like shared memory.
+        """
+        self.on_close = on_close
+        context = multiprocessing.get_context('fork')
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [context.Process(target=_run_worker, args=(function, self.tasks, self.results, os.getpid()),
+                                          daemon=True) for _ in range(workers)]
+        for process in self.processes:
+            process.start()
+        self.previous_handler = signal.signal(signal.SIGTERM, self._terminated)
+
+    def _terminated(self, signal_number, frame) -> None:
+        """
+        Stops the workers, and lets the signal kill the process like it would without the pool.
+        """
+        self.close()
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def map(self, arguments: Sequence[Any]) -> List[Any]:
+        """
+        Applies the function to arguments in parallel. The tasks are handed out in order.
+        @param arguments: The arguments of the tasks.
+        @return: The results of the tasks, in the order of arguments.
+        """
+        for number, argument in enumerate(arguments):
+            self.tasks.put((number, argument))
+        results = [None] * len(arguments)
+        for _ in range(len(arguments)):
+            number, result = self.results.get()
+            if isinstance(result, Exception):
+                raise result
+            results[number] = result
+        return results
+
+    def start(self, arguments: Sequence[Any]) -> None:
+        """
+        Hands out tasks without waiting for them, like searches that run until the pool is closed. Their results
+        are discarded.
+        @param arguments: The arguments of the tasks.
+        """
+        for argument in arguments:
+            self.tasks.put((None, argument))
+
+    def close(self) -> None:
+        """
+        Terminates the workers, calls on_close and restores the SIGTERM handler of the process.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGTERM, self.previous_handler)
+            self.previous_handler = None
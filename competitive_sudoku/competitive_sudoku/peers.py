@@ -0,0 +1,150 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import FrozenSet, Iterable, List, Tuple
+from competitive_sudoku.sudoku import Move
+
+# Squares are numbered k = i * N + j, and moves are encoded as k * N + value - 1, as in competitive_sudoku.movelist.
+
+
+class PeerTable(object):
+    """
+    Precomputed neighbourhoods of the squares of a board with blocks of size m x n. The peers of a square are the
+    other squares in its row, column and block. After a move (i, j, value) the moves that become illegal are exactly
+    the other moves in square (i, j) and the moves with the same value in the peers of (i, j).
+    """
+
+    def __init__(self, m: int, n: int):
+        """
+        Computes the tables. Use peer_table to get a shared instance.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        """
+        N = m * n
+        self.m = m
+        self.n = n
+        self.N = N
+
+        # peers[k] contains the peers of square k, in increasing order
+        self.peers: List[Tuple[int, ...]] = []
+
+        # closed_peers[k] contains square k and its peers
+        self.closed_peers: List[FrozenSet[int]] = []
+
+        for k in range(N * N):
+            i, j = divmod(k, N)
+            i0 = (i // m) * m
+            j0 = (j // n) * n
+            squares = set(i * N + c for c in range(N))
+            squares.update(r * N + j for r in range(N))
+            squares.update(r * N + c for r in range(i0, i0 + m) for c in range(j0, j0 + n))
+            squares.discard(k)
+            self.peers.append(tuple(sorted(squares)))
+            squares.add(k)
+            self.closed_peers.append(frozenset(squares))
+
+        # regions contains the squares of every row, column and block
+        self.regions: List[Tuple[int, ...]] = []
+        for r in range(N):
+            self.regions.append(tuple(r * N + c for c in range(N)))
+        for c in range(N):
+            self.regions.append(tuple(r * N + c for r in range(N)))
+        for i0 in range(0, N, m):
+            for j0 in range(0, N, n):
+                self.regions.append(tuple(r * N + c for r in range(i0, i0 + m) for c in range(j0, j0 + n)))
+
+        # square_regions[k] contains the indices in regions of the row, column and block of square k
+        self.square_regions: List[Tuple[int, int, int]] = []
+        for k in range(N * N):
+            i, j = divmod(k, N)
+            self.square_regions.append((i, N + j, 2 * N + (i // m) * m + j // n))
+
+        # conflicts[code] contains the codes of the moves that become illegal after the move with the given code
+        self.conflicts: List[FrozenSet[int]] = []
+        for k in range(N * N):
+            same_square = [k * N + v for v in range(N)]
+            for v in range(N):
+                self.conflicts.append(frozenset(same_square + [p * N + v for p in self.peers[k]]))
+
+    def update_moves(self, all_moves: Iterable[Move], i: int, j: int, value: int) -> List[Move]:
+        """
+        Removes the moves that become illegal after the move (i, j, value). The order of the moves is preserved.
+        @param all_moves: The legal moves before the move.
+        @param i: Row coordinate of the move
+        @param j: Column coordinate of the move
+        @param value: Value of the move
+        @return: The legal moves after the move.
+        """
+        N = self.N
+        closed_peers = self.closed_peers[i * N + j]
+        new_moves = []
+        for other_move in all_moves:
+            if other_move.value != value:
+                if other_move.i != i or other_move.j != j:
+                    new_moves.append(other_move)
+            elif other_move.i * N + other_move.j not in closed_peers:
+                new_moves.append(other_move)
+        return new_moves
+
+    def update_codes(self, all_moves: Iterable[int], code: int) -> List[int]:
+        """
+        Removes the encoded moves that become illegal after the move with the given code. The order of the moves is
+        preserved.
+        @param all_moves: The codes of the legal moves before the move.
+        @param code: The code of the move.
+        @return: The codes of the legal moves after the move.
+        """
+        conflicts = self.conflicts[code]
+        return [other for other in all_moves if other not in conflicts]
+
+    def update_masks(self, masks: List[int], i: int, j: int, value: int) -> List[int]:
+        """
+        Updates candidate masks for a move (i, j, value). The candidates of square k are stored in masks[k], with bit
+        value - 1 set if value can be put in square k. The work is proportional to the number of peers, and does not
+        depend on the number of moves.
+        @param masks: The candidate masks of the squares before the move. It is not modified.
+        @param i: Row coordinate of the move
+        @param j: Column coordinate of the move
+        @param value: Value of the move
+        @return: The candidate masks after the move.
+        """
+        k = i * self.N + j
+        clear = ~(1 << (value - 1))
+        masks = masks[:]
+        masks[k] = 0
+        for p in self.peers[k]:
+            masks[p] &= clear
+        return masks
+
+
+_peer_tables = {}
+
+
+def peer_table(m: int, n: int) -> PeerTable:
+    """
+    Gets the peer table of boards with blocks of size m x n. Tables are computed once per process.
+    @param m: The number of rows in a block.
+    @param n: The number of columns in a block.
+    @return: The peer table.
+    """
+    table = _peer_tables.get((m, n))
+    if table is None:
+        table = PeerTable(m, n)
+        _peer_tables[m, n] = table
+    return table
+
+
+def update_moves(all_moves: Iterable[Move], i: int, j: int, value: int, m: int, n: int) -> List[Move]:
+    """
+    Removes the moves that become illegal after the move (i, j, value), i.e. the other moves in square (i, j) and the
+    moves with the same value in the same row, column or block. The order of the moves is preserved.
+    @param all_moves: The legal moves before the move.
+    @param i: Row coordinate of the move
+    @param j: Column coordinate of the move
+    @param value: Value of the move
+    @param m: The number of rows in a block.
+    @param n: The number of columns in a block.
+    @return: The legal moves after the move.
+    """
+    return peer_table(m, n).update_moves(all_moves, i, j, value)
@@ -2,12 +2,15 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from typing import List, Tuple, Union
+from typing import Iterable, List, Set, Tuple, Union
 
 
 class Move(object):
     """A Move is a tuple (i, j, value) that represents the action board.put(i, j, value) for a given
-    sudoku configuration board."""
+    sudoku configuration board. Moves are hashable, and moves with the same (i, j, value) are equal, also if one of
+    them is a TabooMove."""
+
+    __slots__ = ('i', 'j', 'value')
 
     def __init__(self, i: int, j: int, value: int):
         """
@@ -24,7 +27,12 @@ class Move(object):
         return f'({self.i},{self.j}) -> {self.value}'
 
     def __eq__(self, other):
-        return (self.i, self.j, self.value) == (other.i, other.j, other.value)
+        if not isinstance(other, Move):
+            return NotImplemented
+        return self.i == other.i and self.j == other.j and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.i, self.j, self.value))
 
 
 class TabooMove(Move):
@@ -32,6 +40,8 @@ class TabooMove(Move):
     move would cause the sudoku to become unsolvable.
     """
 
+    __slots__ = ()
+
     """
     Constructs a taboo move.
     @param i: A row value in the range [0, ..., N)
@@ -42,6 +52,124 @@ class TabooMove(Move):
         super().__init__(i, j, value)
 
 
+_move_tables = {}
+
+
+def move_table(N: int) -> List[Move]:
+    """
+    Gets the interned moves for boards with N * N squares. The move (i, j, value) is stored at index
+    (i * N + j) * N + value - 1. Moves are never modified, so the same objects can be shared by all searches.
+    @param N: The number of values of the board.
+    @return: A list of N * N * N moves.
+    """
+    moves = _move_tables.get(N)
+    if moves is None:
+        moves = [Move(i, j, value) for i in range(N) for j in range(N) for value in range(1, N + 1)]
+        _move_tables[N] = moves
+    return moves
+
+
+class TabooMoveList(list):
+    """
+    A list of moves with constant time membership tests. A set with the coordinates and values of the moves is kept
+    next to the list, so `move in taboo_moves` does not scan the list. The order of the moves is preserved.
+    """
+
+    def __init__(self, moves: Iterable[Move] = ()):
+        super().__init__(moves)
+        self._keys = set((move.i, move.j, move.value) for move in self)
+
+    def __contains__(self, move) -> bool:
+        try:
+            return (move.i, move.j, move.value) in self._keys
+        except AttributeError:
+            return False
+
+    def _rebuild(self) -> None:
+        self._keys = set((move.i, move.j, move.value) for move in self)
+
+    def append(self, move: Move) -> None:
+        super().append(move)
+        self._keys.add((move.i, move.j, move.value))
+
+    def extend(self, moves: Iterable[Move]) -> None:
+        for move in moves:
+            self.append(move)
+
+    def __iadd__(self, moves: Iterable[Move]):
+        self.extend(moves)
+        return self
+
+    def insert(self, index: int, move: Move) -> None:
+        super().insert(index, move)
+        self._keys.add((move.i, move.j, move.value))
+
+    def remove(self, move: Move) -> None:
+        super().remove(move)
+        self._rebuild()
+
+    def pop(self, index: int = -1) -> Move:
+        move = super().pop(index)
+        self._rebuild()
+        return move
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys.clear()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self._rebuild()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self._rebuild()
+
+    def copy(self) -> 'TabooMoveList':
+        return TabooMoveList(self)
+
+    def __reduce__(self):
+        return TabooMoveList, (list(self),)
+
+
+_zobrist_tables = {}
+
+
+def zobrist_keys(N: int) -> List[int]:
+    """
+    Gets the Zobrist keys for boards with N * N squares. The key of value in square k is stored at index k * N + value - 1.
+    The keys are generated with a fixed seed, such that hashes are the same in every process.
+    @param N: The number of values of the board.
+    @return: A list of N * N * N random 64 bit integers.
+    """
+    keys = _zobrist_tables.get(N)
+    if keys is None:
+        import random
+        generator = random.Random(N)
+        keys = [generator.getrandbits(64) for _ in range(N * N * N)]
+        _zobrist_tables[N] = keys
+    return keys
+
+
+_taboo_tables = {}
+
+
+def taboo_keys(N: int) -> List[int]:
+    """
+    Gets the Zobrist keys of taboo moves for boards with N * N squares. They are independent of the keys of
+    zobrist_keys, and the key of the move with code c is stored at index c.
+    @param N: The number of values of the board.
+    @return: A list of N * N * N random 64 bit integers.
+    """
+    keys = _taboo_tables.get(N)
+    if keys is None:
+        import random
+        generator = random.Random(f'taboo-{N}')
+        keys = [generator.getrandbits(64) for _ in range(N * N * N)]
+        _taboo_tables[N] = keys
+    return keys
+
+
 class SudokuBoard(object):
     """
     A simple board class for Sudoku. It supports arbitrary rectangular blocks.
@@ -60,6 +188,7 @@ class SudokuBoard(object):
         self.n = n
         self.N = N     # N = m * n, numbers are in the range [1, ..., N]
         self.squares = [SudokuBoard.empty] * (N * N)  # The N*N squares of the board
+        self.hash = 0  # The Zobrist hash of the squares, it is updated incrementally by put
 
     def rc2f(self, i: int, j: int):
         """
@@ -84,12 +213,19 @@ class SudokuBoard(object):
 
     def put(self, i: int, j: int, value: int) -> None:
         """
-        Puts the given value on the square with coordinates (i, j).
+        Puts the given value on the square with coordinates (i, j), and updates the Zobrist hash of the board.
         @param i: A row value in the range [0, ..., N)
         @param j: A column value in the range [0, ..., N)
         @param value: A value in the range [1, ..., N]
         """
         k = self.rc2f(i, j)
+        N = self.N
+        keys = zobrist_keys(N)
+        old_value = self.squares[k]
+        if old_value != SudokuBoard.empty:
+            self.hash ^= keys[k * N + old_value - 1]
+        if value != SudokuBoard.empty:
+            self.hash ^= keys[k * N + value - 1]
         self.squares[k] = value
 
     def get(self, i: int, j: int):
@@ -102,6 +238,56 @@ class SudokuBoard(object):
         k = self.rc2f(i, j)
         return self.squares[k]
 
+    def block_index(self, i: int, j: int) -> int:
+        """
+        Gets the index of the block that contains the square with coordinates (i, j). Blocks are numbered row by row.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: The block index in the range [0, ..., N)
+        """
+        return (i // self.m) * self.m + j // self.n
+
+    def candidates(self, i: int, j: int) -> int:
+        """
+        Gets the values that do not yet occur in the row, column and block of the square with coordinates (i, j).
+        The result is a bitmask in which bit value - 1 is set if value is a candidate.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask of candidate values.
+        """
+        m = self.m
+        n = self.n
+        N = self.N
+        used = 0
+        for z in range(N):
+            used |= 1 << self.get(i, z)
+            used |= 1 << self.get(z, j)
+        i_start = (i // m) * m
+        j_start = (j // n) * n
+        for x in range(i_start, i_start + m):
+            for y in range(j_start, j_start + n):
+                used |= 1 << self.get(x, y)
+        return (~used >> 1) & ((1 << N) - 1)
+
+    def region_empty_counts(self, i: int, j: int) -> Tuple[int, int, int]:
+        """
+        Counts the empty squares in the row, column and block of the square with coordinates (i, j).
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: The number of empty squares in the row, the column and the block.
+        """
+        m = self.m
+        n = self.n
+        N = self.N
+        empty = SudokuBoard.empty
+        row = sum(1 for z in range(N) if self.get(i, z) == empty)
+        column = sum(1 for z in range(N) if self.get(z, j) == empty)
+        i_start = (i // m) * m
+        j_start = (j // n) * n
+        block = sum(1 for x in range(i_start, i_start + m) for y in range(j_start, j_start + n)
+                    if self.get(x, y) == empty)
+        return row, column, block
+
     def __str__(self) -> str:
         """
         Prints the board in a simple textual format. The first line contains the values m and n. Then the contents of
@@ -128,6 +314,114 @@ class SudokuBoard(object):
         return out.getvalue()
 
 
+class BitSudokuBoard(SudokuBoard):
+    """
+    A Sudoku board that maintains bitmasks of the values used in every row, column and block, together with the
+    number of empty squares in them. The bookkeeping is updated incrementally by put, which makes candidates and
+    region_empty_counts constant time operations.
+    """
+
+    def __init__(self, m: int = 3, n: int = 3):
+        """
+        Constructs an empty Sudoku with blocks of size m x n.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        """
+        super().__init__(m, n)
+        N = self.N
+        self.full_mask = (1 << N) - 1  # The bitmask containing all values [1, ..., N]
+        self.row_masks = [0] * N       # Bit value - 1 is set if value occurs in the row
+        self.column_masks = [0] * N    # Bit value - 1 is set if value occurs in the column
+        self.block_masks = [0] * N     # Bit value - 1 is set if value occurs in the block
+        self.row_empty = [N] * N       # The number of empty squares in every row
+        self.column_empty = [N] * N    # The number of empty squares in every column
+        self.block_empty = [N] * N     # The number of empty squares in every block
+
+    @staticmethod
+    def from_board(board: SudokuBoard) -> 'BitSudokuBoard':
+        """
+        Constructs a bitboard with the same contents as the given board.
+        @param board: A sudoku board.
+        @return: The generated bitboard.
+        """
+        result = BitSudokuBoard(board.m, board.n)
+        for k, value in enumerate(board.squares):
+            if value != SudokuBoard.empty:
+                i, j = result.f2rc(k)
+                result.put(i, j, value)
+        return result
+
+    def put(self, i: int, j: int, value: int) -> None:
+        """
+        Puts the given value on the square with coordinates (i, j), and updates the masks and counters of the row,
+        column and block of the square, and the Zobrist hash. Putting SudokuBoard.empty clears the square.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N], or SudokuBoard.empty
+        """
+        N = self.N
+        k = N * i + j
+        b = (i // self.m) * self.m + j // self.n
+        keys = zobrist_keys(N)
+        old_value = self.squares[k]
+        if old_value != SudokuBoard.empty:
+            self.hash ^= keys[k * N + old_value - 1]
+            bit = ~(1 << (old_value - 1))
+            self.row_masks[i] &= bit
+            self.column_masks[j] &= bit
+            self.block_masks[b] &= bit
+            self.row_empty[i] += 1
+            self.column_empty[j] += 1
+            self.block_empty[b] += 1
+        if value != SudokuBoard.empty:
+            self.hash ^= keys[k * N + value - 1]
+            bit = 1 << (value - 1)
+            self.row_masks[i] |= bit
+            self.column_masks[j] |= bit
+            self.block_masks[b] |= bit
+            self.row_empty[i] -= 1
+            self.column_empty[j] -= 1
+            self.block_empty[b] -= 1
+        self.squares[k] = value
+
+    def candidates(self, i: int, j: int) -> int:
+        """
+        Gets the values that do not yet occur in the row, column and block of the square with coordinates (i, j).
+        The result is a bitmask in which bit value - 1 is set if value is a candidate.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask of candidate values.
+        """
+        b = (i // self.m) * self.m + j // self.n
+        return self.full_mask & ~(self.row_masks[i] | self.column_masks[j] | self.block_masks[b])
+
+    def region_empty_counts(self, i: int, j: int) -> Tuple[int, int, int]:
+        """
+        Gets the number of empty squares in the row, column and block of the square with coordinates (i, j).
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: The number of empty squares in the row, the column and the block.
+        """
+        b = (i // self.m) * self.m + j // self.n
+        return self.row_empty[i], self.column_empty[j], self.block_empty[b]
+
+
+def mask_values(mask: int) -> List[int]:
+    """
+    Converts a bitmask of values, as returned by SudokuBoard.candidates, into a list of values.
+    @param mask: A bitmask in which bit value - 1 is set for every value in the set.
+    @return: The values in the bitmask in increasing order.
+    """
+    values = []
+    value = 1
+    while mask:
+        if mask & 1:
+            values.append(value)
+        mask >>= 1
+        value += 1
+    return values
+
+
 # written by Gennaro Gala
 def print_board(board: SudokuBoard) -> str:
     import io
@@ -216,7 +510,8 @@ def load_sudoku_from_text(text: str) -> SudokuBoard:
         s = words[k + 2]
         if s != '.':
             value = int(s)
-            result.squares[k] = value
+            i, j = result.f2rc(k)
+            result.put(i, j, value)
     return result
 
 
@@ -243,6 +538,9 @@ def save_sudoku(filename, board: SudokuBoard) -> None:
 
 
 class GameState(object):
+    # The reward of a move that completes zero, one, two or three regions (a row, a column and a block)
+    region_scores = (0, 1, 3, 7)
+
     def __init__(self,
                  initial_board: SudokuBoard,
                  board: SudokuBoard,
@@ -252,15 +550,75 @@ class GameState(object):
         """
         @param initial_board: A sudoku board. It contains the start position of a game.
         @param board: A sudoku board. It contains the current position of a game.
-        @param taboo_moves: A list of taboo moves. Moves in this list cannot be played.
+        @param taboo_moves: A list of taboo moves. Moves in this list cannot be played. It is stored as a
+        TabooMoveList, which has constant time membership tests.
         @param moves: The history of a sudoku game, starting in initial_board.
         @param scores: The current scores of the first and the second player.
         """
         self.initial_board = initial_board
         self.board = board
-        self.taboo_moves = taboo_moves
+        self.taboo_moves = taboo_moves if isinstance(taboo_moves, TabooMoveList) else TabooMoveList(taboo_moves)
         self.moves = moves
         self.scores = scores
+        self.move_scores: List[int] = []  # The rewards of the moves that were played using push
+        self._empty_squares = None
+
+    @property
+    def empty_squares(self) -> Set[Tuple[int, int]]:
+        """
+        Gets the coordinates of the empty squares of the board. The set is computed on first use, and after that it
+        is kept up to date by push and pop.
+        @return: The set of coordinates (i, j) of the empty squares.
+        """
+        if self._empty_squares is None:
+            board = self.board
+            self._empty_squares = set(board.f2rc(k) for k, value in enumerate(board.squares)
+                                      if value == SudokuBoard.empty)
+        return self._empty_squares
+
+    def current_player(self) -> int:
+        """
+        Gives the index of the current player (1 or 2). The convention is that player 1 does the first move of the
+        game.
+        @return: The index of the current player.
+        """
+        return 1 if len(self.moves) % 2 == 0 else 2
+
+    def push(self, move: Union[Move, TabooMove]) -> int:
+        """
+        Plays a move for the current player. The board, the empty squares, the score of the player and the move
+        history are updated together, such that the move can be undone using pop. A TabooMove only passes the turn.
+        N.B. The move must be legal, this is not checked. If board is a BitSudokuBoard this takes constant time.
+        @param move: The move to be played.
+        @return: The reward of the move.
+        """
+        score = 0
+        if not isinstance(move, TabooMove):
+            i, j = move.i, move.j
+            board = self.board
+            empty_row, empty_column, empty_block = board.region_empty_counts(i, j)
+            score = GameState.region_scores[(empty_row == 1) + (empty_column == 1) + (empty_block == 1)]
+            board.put(i, j, move.value)
+            if self._empty_squares is not None:
+                self._empty_squares.discard((i, j))
+        self.scores[len(self.moves) % 2] += score
+        self.moves.append(move)
+        self.move_scores.append(score)
+        return score
+
+    def pop(self) -> Union[Move, TabooMove]:
+        """
+        Undoes the last move that was played using push.
+        @return: The move that was undone.
+        """
+        move = self.moves.pop()
+        score = self.move_scores.pop()
+        self.scores[len(self.moves) % 2] -= score
+        if not isinstance(move, TabooMove):
+            self.board.put(move.i, move.j, SudokuBoard.empty)
+            if self._empty_squares is not None:
+                self._empty_squares.add((move.i, move.j))
+        return move
 
     def __str__(self):
         import io
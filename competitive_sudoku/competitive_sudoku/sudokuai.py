@@ -2,10 +2,36 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from typing import List
+import multiprocessing
+import time
+from typing import List, Optional
 from competitive_sudoku.sudoku import GameState, Move
 
 
+class BestMoveSlot(object):
+    """
+    A best move (i, j, value) in shared memory. It supports the list operations that are applied to SudokuAI.best_move,
+    without the messages to a manager process of a Manager().list. Like that list, it is protected by SudokuAI.lock:
+    propose_move holds the lock while it writes the move, and the game holds it while it stops the player, such that
+    a player is never stopped halfway a write.
+    """
+
+    def __init__(self):
+        self.array = multiprocessing.RawArray('q', 3)
+
+    def __getitem__(self, index: int) -> int:
+        return self.array[index]
+
+    def __setitem__(self, index: int, value: int) -> None:
+        self.array[index] = value
+
+    def __iter__(self):
+        return iter(self.array[:])
+
+    def __len__(self):
+        return 3
+
+
 class SudokuAI(object):
     """
     Sudoku AI that computes the best move in a given sudoku configuration.
@@ -15,6 +41,10 @@ class SudokuAI(object):
         self.best_move: List[int] = [0, 0, 0]
         self.lock = None
 
+        # The time (as returned by time.time) at which the calculation time of the current move is over. It is set by
+        # the game before compute_best_move is called, and it is None if the calculation time is unknown.
+        self.deadline: Optional[float] = None
+
     def compute_best_move(self, game_state: GameState) -> None:
         """
         This function should compute the best move in game_state.board. It should report the best move by making one
@@ -24,6 +54,14 @@ class SudokuAI(object):
         """
         raise NotImplementedError
 
+    def remaining_time(self) -> Optional[float]:
+        """
+        @return: The number of seconds until the deadline of the current move, or None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
     def propose_move(self, move: Move) -> None:
         """
         Updates the best move that has been found so far.
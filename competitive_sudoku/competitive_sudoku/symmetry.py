@@ -0,0 +1,322 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Dict, List, Optional, Tuple
+from competitive_sudoku.sudoku import SudokuBoard
+
+# A board with blocks of size m x n has N / m bands of m rows and N / n stacks of n columns. The symmetries of the game
+# are the relabelings of the values, the permutations of the rows within a band, of the bands, of the columns within
+# a stack and of the stacks, and the transposition if m == n. They map legal moves to legal moves and completed regions
+# to completed regions, so symmetric positions have the same game value.
+
+
+def _place_row(values: List[int], N: int, n: int, col_map: List[int], target_cols: List[int],
+               stack_map: List[int], target_stacks: List[int], labels: List[int], next_label: int,
+               results: List[Tuple]) -> None:
+    """
+    Maps the columns of a row that are not mapped yet, such that the row becomes lexicographically minimal. The
+    target columns are filled from left to right, and a free target column always gets a value if one of the remaining
+    columns can be mapped to it. If several new values compete for a column, all of them are tried.
+    @param values: The values of the row in the source board.
+    @param results: The tuples (output, col_map, target_cols, stack_map, target_stacks, labels, next_label) are
+    appended to it. The output is the sequence of pairs (target column, label) of the row, closed by N.
+    """
+    output = []
+
+    def place(T: int, next_label: int) -> None:
+        # The values that are labeled in mapped columns, their labels are removed again before returning
+        labeled = []
+        _place(T, next_label, labeled)
+        for value in labeled:
+            labels[value] = 0
+
+    def _place(T: int, next_label: int, labeled: List[int]) -> None:
+        while T < N:
+            c = target_cols[T]
+            if c >= 0:
+                value = values[c]
+                if value:
+                    if not labels[value]:
+                        labels[value] = next_label
+                        labeled.append(value)
+                        next_label += 1
+                    output.extend((T, labels[value]))
+                T += 1
+                continue
+
+            # Find the unmapped columns with a value that can be mapped to T
+            S = T // n
+            s = target_stacks[S]
+            if s >= 0:
+                candidates = [c for c in range(s * n, s * n + n) if col_map[c] < 0 and values[c]]
+            else:
+                candidates = [c for c in range(N) if col_map[c] < 0 and values[c] and stack_map[c // n] < 0]
+            if not candidates:
+                T += 1
+                continue
+
+            # Old values have distinct labels, so only new values can tie
+            best = min(labels[values[c]] or next_label for c in candidates)
+            if best < next_label:
+                candidates = [c for c in candidates if labels[values[c]] == best]
+            length = len(output)
+            for c in candidates:
+                value = values[c]
+                new_value = not labels[value]
+                new_stack = s < 0
+                if new_stack:
+                    stack_map[c // n] = S
+                    target_stacks[S] = c // n
+                col_map[c] = T
+                target_cols[T] = c
+                if new_value:
+                    labels[value] = next_label
+                output.extend((T, labels[value]))
+                place(T + 1, next_label + new_value)
+                del output[length:]
+                if new_value:
+                    labels[value] = 0
+                col_map[c] = -1
+                target_cols[T] = -1
+                if new_stack:
+                    stack_map[c // n] = -1
+                    target_stacks[S] = -1
+            return
+
+        output.append(N)
+        results.append((tuple(output), col_map[:], target_cols[:], stack_map[:], target_stacks[:], labels[:],
+                        next_label))
+        output.pop()
+
+    place(0, next_label)
+
+
+def _canonicalize(board: SudokuBoard) -> Tuple[Tuple[int, ...], Tuple]:
+    """
+    Computes the canonical form of a board, see canonical_form.
+    @return: The canonical form, and a branch (transposed, order, col_map, target_cols, stack_map, target_stacks,
+    labels) of a symmetry that maps board to it, where order contains the source rows of the target rows.
+    """
+    m, n, N = board.m, board.n, board.N
+    squares = board.squares
+    variants = [[squares[i * N: (i + 1) * N] for i in range(N)]]
+    if m == n:
+        variants.append([[squares[i * N + j] for i in range(N)] for j in range(N)])
+
+    # A branch is (variant, order, used_rows, band, col_map, target_cols, stack_map, target_stacks, labels,
+    # next_label), where order contains the source rows of the target rows, col_map maps source columns to target
+    # columns, and target_cols is its inverse. The same holds for stacks.
+    bands = N // m
+    stacks = N // n
+    branches = [(variant, (), 0, -1, [-1] * N, [-1] * N, [-1] * stacks, [-1] * stacks, [0] * (N + 1), 1)
+                for variant in range(len(variants))]
+    empty = (N,)
+    form = []
+    for t in range(N):
+        best = None
+        next_branches = []
+        for variant, order, used_rows, band, col_map, target_cols, stack_map, target_stacks, labels, next_label \
+                in branches:
+            rows = variants[variant]
+            # The candidate source rows; empty rows of the same band are interchangeable, and so are empty bands
+            if t % m == 0:
+                candidate_bands = []
+                empty_band = False
+                for b in range(bands):
+                    if used_rows >> (b * m) & ((1 << m) - 1):
+                        continue
+                    if not any(any(rows[r]) for r in range(b * m, b * m + m)):
+                        if empty_band:
+                            continue
+                        empty_band = True
+                    candidate_bands.append(b)
+            else:
+                candidate_bands = [band]
+            for b in candidate_bands:
+                empty_row = False
+                for r in range(b * m, b * m + m):
+                    if used_rows >> r & 1:
+                        continue
+                    if not any(rows[r]):
+                        # The row does not change the partial symmetry
+                        if empty_row:
+                            continue
+                        empty_row = True
+                        if best is None or empty < best:
+                            best = empty
+                            next_branches = []
+                        if empty == best:
+                            next_branches.append((variant, order + (r,), used_rows | (1 << r), b, col_map,
+                                                  target_cols, stack_map, target_stacks, labels, next_label))
+                        continue
+                    results = []
+                    _place_row(rows[r], N, n, col_map[:], target_cols[:], stack_map[:], target_stacks[:], labels[:],
+                               next_label, results)
+                    for output, *state in results:
+                        if best is None or output < best:
+                            best = output
+                            next_branches = []
+                        if output == best:
+                            next_branches.append((variant, order + (r,), used_rows | (1 << r), b, *state))
+        branches = next_branches
+        form.append(best)
+
+    result = [SudokuBoard.empty] * (N * N)
+    for t, output in enumerate(form):
+        for index in range(0, len(output) - 1, 2):
+            result[t * N + output[index]] = output[index + 1]
+    variant, order, _, _, *state, _ = branches[0]
+    return tuple(result), (variant == 1, order, *state)
+
+
+def canonical_form(board: SudokuBoard) -> Tuple[int, ...]:
+    """
+    Computes the canonical form of a board: the lexicographically smallest board, read row by row, that is obtained
+    from board by a symmetry of the game, where every value is relabeled to the order of its first occurrence. Two
+    boards have the same canonical form if and only if they are symmetric. The form is constructed one row at a time,
+    keeping all partial symmetries that give the smallest rows so far. This is fast for sparse boards, but the number
+    of partial symmetries can become large for boards with many filled squares.
+    @param board: A sudoku board.
+    @return: The values of the canonical board, row by row, where empty squares are 0.
+    """
+    return _canonicalize(board)[0]
+
+
+class Symmetry(object):
+    """
+    A symmetry of the game on boards with blocks of size m x n. It maps square (i, j) with value v to square
+    (rows[i], columns[j]) with value values[v] of the image, after transposing the board if transposed is True.
+    """
+
+    def __init__(self, m: int, n: int, transposed: bool, rows: List[int], columns: List[int], values: List[int]):
+        """
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param transposed: If True, the board is transposed first.
+        @param rows: The permutation of the rows.
+        @param columns: The permutation of the columns.
+        @param values: The permutation of the values, with values[0] == 0.
+        """
+        self.m = m
+        self.n = n
+        self.transposed = transposed
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.inverse_rows = [0] * len(rows)
+        self.inverse_columns = [0] * len(columns)
+        self.inverse_values = [0] * len(values)
+        for index, row in enumerate(rows):
+            self.inverse_rows[row] = index
+        for index, column in enumerate(columns):
+            self.inverse_columns[column] = index
+        for index, value in enumerate(values):
+            self.inverse_values[value] = index
+
+    def apply(self, i: int, j: int, value: int) -> Tuple[int, int, int]:
+        """
+        @return: The image (i, j, value) of square (i, j) with the given value.
+        """
+        if self.transposed:
+            i, j = j, i
+        return self.rows[i], self.columns[j], self.values[value]
+
+    def invert(self, i: int, j: int, value: int) -> Tuple[int, int, int]:
+        """
+        @return: The square (i, j) with a value whose image is square (i, j) with the given value.
+        """
+        i, j, value = self.inverse_rows[i], self.inverse_columns[j], self.inverse_values[value]
+        if self.transposed:
+            i, j = j, i
+        return i, j, value
+
+
+def canonical_symmetry(board: SudokuBoard) -> Tuple[Tuple[int, ...], Symmetry]:
+    """
+    Computes the canonical form of a board, together with a symmetry that maps board to it. If the board has
+    symmetries of its own, one of the possible symmetries is returned.
+    @param board: A sudoku board.
+    @return: The canonical form, as computed by canonical_form, and the symmetry.
+    """
+    m, n, N = board.m, board.n, board.N
+    form, (transposed, order, _, target_cols, _, target_stacks, labels) = _canonicalize(board)
+
+    # The empty columns and the values that are not on the board can be mapped arbitrarily, as long as the columns of
+    # a stack stay together
+    free_stacks = [s for s in range(N // n) if s not in target_stacks]
+    target_stacks = [free_stacks.pop(0) if s < 0 else s for s in target_stacks]
+    for T in range(N):
+        if target_cols[T] < 0:
+            s = target_stacks[T // n]
+            target_cols[T] = next(c for c in range(s * n, s * n + n) if c not in target_cols)
+    free_labels = [label for label in range(1, N + 1) if label not in labels]
+    values = [0] + [labels[value] or free_labels.pop(0) for value in range(1, N + 1)]
+    rows = [0] * N
+    columns = [0] * N
+    for t, r in enumerate(order):
+        rows[r] = t
+    for T, c in enumerate(target_cols):
+        columns[c] = T
+    return form, Symmetry(m, n, transposed, rows, columns, values)
+
+
+class SymmetryCache(object):
+    """
+    A cache of search results that is shared by all symmetric positions, indexed by the canonical form of the board.
+    Since the canonical form is exact, different positions never share an entry, provided that they have the same
+    taboo moves. Taboo moves are not mapped by the symmetries, so the cache must not be used in a game with taboo
+    moves, and it must be cleared when the taboo moves change. Computing the canonical form is much
+    more expensive than a Zobrist hash, so the cache is meant for sparse boards and for nodes with a large subtree,
+    like in the opening, where many moves lead to symmetric positions. An entry is a tuple (depth, bound, value), with
+    the bound types of competitive_sudoku.transposition.
+    """
+
+    def __init__(self, max_filled: int = 12, max_entries: int = 1 << 16):
+        """
+        @param max_filled: Boards with more filled squares are not cached.
+        @param max_entries: The maximum number of entries. The cache is cleared when it is full.
+        """
+        self.max_filled = max_filled
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple, Tuple[int, int, object]] = {}
+
+    def key(self, board: SudokuBoard, extra: int = 0) -> Optional[Tuple]:
+        """
+        Computes the key of a position.
+        @param board: A sudoku board.
+        @param extra: Additional information about the position, for example the player to move.
+        @return: The key, or None if the board has too many filled squares.
+        """
+        filled = board.N * board.N - board.squares.count(SudokuBoard.empty)
+        if filled > self.max_filled:
+            return None
+        return canonical_form(board), extra
+
+    def clear(self) -> None:
+        """
+        Removes all entries.
+        """
+        self.entries.clear()
+
+    def lookup(self, key: Tuple) -> Optional[Tuple[int, int, object]]:
+        """
+        @param key: The key of a position, computed with key.
+        @return: The entry (depth, bound, value) of the position, or None if it is not stored.
+        """
+        return self.entries.get(key)
+
+    def store(self, key: Tuple, depth: int, bound: int, value) -> None:
+        """
+        Stores the result of a search, unless a deeper search of the position is stored already.
+        @param key: The key of a position, computed with key.
+        @param depth: The remaining depth of the search.
+        @param bound: The bound type of value.
+        @param value: The value of the position.
+        """
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > depth:
+            return
+        if entry is None and len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        self.entries[key] = (depth, bound, value)
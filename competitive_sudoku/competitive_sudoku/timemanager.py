@@ -0,0 +1,73 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import time
+from typing import List, Optional
+
+
+class TimeManager(object):
+    """
+    Decides if an iterative deepening search has time for its next iteration, given the deadline of the move. An
+    iteration that cannot be finished before the deadline is wasted, since only finished iterations propose a move.
+
+    The duration of the next iteration is predicted from the durations of the previous ones. The durations of
+    alpha-beta iterations grow alternately by a small and a large factor (the odd-even effect). So instead of the
+    effective branching factor, which averages the two, the growth factor of the previous iteration with the same
+    parity is used. With only two iterations, the last growth factor is used, and the first two iterations are always
+    started.
+    """
+
+    def __init__(self, deadline: Optional[float], confidence: float = 0.5):
+        """
+        @param deadline: The time (as returned by time.time) at which the move must be known, or None if there is no
+        known deadline, in which case every iteration is started.
+        @param confidence: An iteration is started if at least this fraction of its predicted duration is left. The
+        prediction errs on the high side, and wrongly skipping an iteration costs a deeper search.
+        """
+        self.deadline = deadline
+        self.confidence = confidence
+        self.durations: List[float] = []
+        self.start = None
+
+    def remaining_time(self) -> Optional[float]:
+        """
+        @return: The number of seconds until the deadline, or None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def start_iteration(self) -> None:
+        """
+        Marks the start of an iteration.
+        """
+        self.start = time.perf_counter()
+
+    def end_iteration(self) -> None:
+        """
+        Marks the end of the iteration that was started last, and records its duration.
+        """
+        self.durations.append(max(time.perf_counter() - self.start, 1e-6))
+
+    def predicted_duration(self) -> Optional[float]:
+        """
+        @return: The predicted duration in seconds of the next iteration, or None if fewer than two iterations have
+        finished.
+        """
+        durations = self.durations
+        if len(durations) < 2:
+            return None
+        if len(durations) == 2:
+            return durations[-1] * durations[-1] / durations[-2]
+        return durations[-1] * durations[-2] / durations[-3]
+
+    def can_start_iteration(self) -> bool:
+        """
+        @return: True if the next iteration is expected to finish before the deadline.
+        """
+        remaining = self.remaining_time()
+        predicted = self.predicted_duration()
+        if remaining is None or predicted is None:
+            return True
+        return predicted * self.confidence <= remaining
@@ -0,0 +1,171 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from multiprocessing import shared_memory
+from typing import Iterable, Optional, Tuple
+from competitive_sudoku.sudoku import Move, SudokuBoard, taboo_keys
+
+# The bound type of a stored value
+EXACT = 0        # The value is the exact minimax value
+LOWER_BOUND = 1  # The search failed high, the minimax value is at least the stored value
+UPPER_BOUND = 2  # The search failed low, the minimax value is at most the stored value
+
+
+def taboo_moves_key(board: SudokuBoard, taboo_moves: Iterable[Move]) -> int:
+    """
+    Combines the Zobrist keys of the taboo moves of a game. The moves of a position depend on these taboo moves, so a
+    search that is kept alive between turns must combine this key with the keys of its positions. Otherwise the
+    results of a turn are used in a later turn with more taboo moves. Taboo moves on filled squares are left out,
+    since they no longer influence the game.
+    @param board: The board at the start of the turn.
+    @param taboo_moves: The taboo moves of the game.
+    @return: The XOR of the keys of the taboo moves.
+    """
+    N = board.N
+    keys = taboo_keys(N)
+    key = 0
+    for code in {(move.i * N + move.j) * N + move.value - 1 for move in taboo_moves
+                 if board.get(move.i, move.j) == SudokuBoard.empty}:
+        key ^= keys[code]
+    return key
+
+
+class TranspositionTable(object):
+    """
+    A fixed size table of search results, indexed by the Zobrist hash of a position. The hash must include everything
+    that the result depends on, like the taboo moves of the game (see taboo_moves_key). An entry is a tuple
+    (key, depth, bound, value, move, generation). When two positions map to the same slot, the entry with the deepest
+    search is kept, unless the stored entry was made during an earlier search.
+    """
+
+    def __init__(self, size: int = 1 << 18):
+        """
+        Constructs an empty transposition table.
+        @param size: The number of slots of the table.
+        """
+        self.size = size
+        self.entries = [None] * size
+        self.generation = 0
+
+    def new_search(self) -> None:
+        """
+        Marks the start of a new search. Entries of earlier searches are kept, but they are replaced first.
+        """
+        self.generation += 1
+
+    def lookup(self, key: int) -> Optional[Tuple]:
+        """
+        Looks up the entry of a position.
+        @param key: The Zobrist hash of the position.
+        @return: The entry (key, depth, bound, value, move, generation), or None if the position is not stored.
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, bound: int, value, move) -> None:
+        """
+        Stores the result of a search, according to the replacement policy.
+        @param key: The Zobrist hash of the position.
+        @param depth: The remaining depth of the search.
+        @param bound: The bound type of value (EXACT, LOWER_BOUND or UPPER_BOUND).
+        @param value: The value of the position.
+        @param move: The best move in the position, or None.
+        """
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[index] = (key, depth, bound, value, move, self.generation)
+
+
+class SharedTranspositionTable(object):
+    """
+    A transposition table in shared memory, with the interface of TranspositionTable. It is read and written by several
+    search processes at the same time without locks, which is how Lazy SMP shares work between them.
+
+    The table consists of buckets of BUCKET_SIZE entries, and a position is stored in the bucket of its key. An entry
+    is two 64 bit words: the key XOR the data, and the data, which packs the value, move, depth, bound and generation.
+    A reader only accepts an entry if XOR-ing the words gives the key, so an entry that is torn by concurrent writes
+    is treated as missing. Values must be integers that fit in 32 bits, moves must be codes below 2^16, and depths
+    must be below 64.
+    """
+
+    BUCKET_SIZE = 4
+    NO_MOVE = 0xFFFF
+
+    def __init__(self, size: int = 1 << 18):
+        """
+        Creates an empty table. The processes that use it must be forked after it is created.
+        @param size: The number of entries of the table.
+        """
+        self.buckets = max(size // self.BUCKET_SIZE, 1)
+        # New shared memory is zero initialized, and an entry with data 0 is empty
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=16 * self.BUCKET_SIZE * self.buckets)
+        self.words = self.shared_memory.buf.cast('Q')
+        self.generation = 0
+
+    def close(self) -> None:
+        """
+        Releases the shared memory. It must be called once, by the process that created the table.
+        """
+        self.words.release()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def new_search(self) -> None:
+        """
+        Marks the start of a new search. Entries of earlier searches are kept, but they are replaced first.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+
+    @staticmethod
+    def _unpack(key: int, data: int) -> Tuple:
+        move = (data >> 32) & 0xFFFF
+        return (key, (data >> 48) & 0x3F, (data >> 54) & 0x3, (data & 0xFFFFFFFF) - (1 << 31),
+                None if move == SharedTranspositionTable.NO_MOVE else move, data >> 56)
+
+    def lookup(self, key: int) -> Optional[Tuple]:
+        """
+        Looks up the entry of a position.
+        @param key: The Zobrist hash of the position.
+        @return: The entry (key, depth, bound, value, move, generation), or None if the position is not stored.
+        """
+        words = self.words
+        start = 2 * self.BUCKET_SIZE * (key % self.buckets)
+        for index in range(start, start + 2 * self.BUCKET_SIZE, 2):
+            check = words[index]
+            data = words[index + 1]
+            if data and check ^ data == key:
+                return self._unpack(key, data)
+        return None
+
+    def store(self, key: int, depth: int, bound: int, value, move) -> None:
+        """
+        Stores the result of a search. It replaces the entry of the same position, an empty entry, or else the entry
+        of the bucket that is the least valuable: entries of earlier searches first, and then the most shallow one.
+        @param key: The Zobrist hash of the position.
+        @param depth: The remaining depth of the search.
+        @param bound: The bound type of value (EXACT, LOWER_BOUND or UPPER_BOUND).
+        @param value: The value of the position.
+        @param move: The best move in the position, or None.
+        """
+        words = self.words
+        start = 2 * self.BUCKET_SIZE * (key % self.buckets)
+        slot = None
+        slot_priority = None
+        for index in range(start, start + 2 * self.BUCKET_SIZE, 2):
+            check = words[index]
+            data = words[index + 1]
+            if not data or check ^ data == key:
+                slot = index
+                break
+            priority = (data >> 56 == self.generation, (data >> 48) & 0x3F)
+            if slot_priority is None or priority < slot_priority:
+                slot = index
+                slot_priority = priority
+        data = (int(value) + (1 << 31)) | (self.NO_MOVE if move is None else move) << 32 | depth << 48 \
+            | bound << 54 | self.generation << 56
+        words[slot + 1] = data
+        words[slot] = key ^ data
@@ -0,0 +1,149 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import multiprocessing
+import os
+import signal
+import time
+from competitive_sudoku.sudoku import GameState
+from competitive_sudoku.sudokuai import SudokuAI
+
+# The signal that tells a worker that the calculation time is over. Platforms without SIGUSR1 restart the worker.
+INTERRUPT_SIGNAL = getattr(signal, 'SIGUSR1', None)
+
+
+class MoveInterrupted(BaseException):
+    """
+    Raised inside compute_best_move when the calculation time is over. It derives from BaseException, such that it is
+    not caught by an 'except Exception' clause of a player.
+    """
+
+
+def _run_worker(player: SudokuAI, connection) -> None:
+    """
+    The main loop of a worker. It receives requests (number, game_state, deadline) and answers every request with its
+    number when compute_best_move has returned or has been interrupted. A request None stops the worker.
+    @param player: The AI of the player.
+    @param connection: The worker side of the pipe to the game.
+    """
+    computing = False
+
+    def interrupt(signal_number, frame):
+        if computing:
+            raise MoveInterrupted()
+
+    if INTERRUPT_SIGNAL is not None:
+        signal.signal(INTERRUPT_SIGNAL, interrupt)
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            # The game has ended without closing the worker
+            break
+        if request is None:
+            break
+        number, game_state, player.deadline = request
+        try:
+            computing = True
+            player.compute_best_move(game_state)
+            computing = False
+        except MoveInterrupted:
+            pass
+        except Exception as err:
+            computing = False
+            print('Error: an exception occurred.\n', err)
+        connection.send(number)
+
+
+class AgentWorker(object):
+    """
+    Runs a player in a long-lived process, such that the state of the player (for example a transposition table)
+    survives between moves. The best move is reported through player.best_move, exactly like with a process per move,
+    so player.best_move and player.lock must be set before the worker is started.
+    """
+
+    def __init__(self, player: SudokuAI, grace_time: float = 1.0):
+        """
+        Starts the worker.
+        @param player: The AI of the player.
+        @param grace_time: The time in seconds that a player gets to stop after it has been interrupted. If it takes
+        longer, the worker is restarted.
+        """
+        self.player = player
+        self.grace_time = grace_time
+        self.request_number = 0
+        self.process = None
+        self.connection = None
+        self.start()
+
+    def start(self) -> None:
+        """
+        Starts a new worker process, with a fresh copy of the player.
+        """
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_run_worker, args=(self.player, worker_connection))
+        self.process.start()
+        worker_connection.close()
+
+    def restart(self) -> None:
+        """
+        Kills the worker process and starts a new one. The state of the player is lost.
+        """
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+        self.start()
+
+    def _wait(self, timeout: float) -> bool:
+        """
+        Waits until the worker has answered the current request. Answers to earlier requests are skipped.
+        @param timeout: The maximum waiting time in seconds.
+        @return: True if the current request has been answered.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if not self.connection.poll(max(remaining, 0)):
+                return False
+            if self.connection.recv() == self.request_number:
+                return True
+
+    def compute_best_move(self, game_state: GameState, calculation_time: float, lock) -> None:
+        """
+        Lets the player compute a move. The call returns as soon as the player is done, or when the calculation time
+        is over. In the latter case the player is interrupted while lock is held. Since propose_move holds the lock
+        while it writes player.best_move, the player cannot be interrupted halfway a write.
+        @param game_state: A game state.
+        @param calculation_time: The amount of time in seconds for computing the best move.
+        @param lock: The lock that protects player.best_move.
+        """
+        self.request_number += 1
+        self.connection.send((self.request_number, game_state, time.time() + calculation_time))
+        if self._wait(calculation_time):
+            return
+        lock.acquire()
+        try:
+            if INTERRUPT_SIGNAL is None:
+                self.restart()
+            else:
+                os.kill(self.process.pid, INTERRUPT_SIGNAL)
+                if not self._wait(self.grace_time):
+                    self.restart()
+        finally:
+            lock.release()
+
+    def close(self) -> None:
+        """
+        Stops the worker process.
+        """
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(self.grace_time)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
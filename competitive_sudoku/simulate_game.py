@@ -14,7 +14,8 @@ import time
 from pathlib import Path
 from competitive_sudoku.execute import solve_sudoku
 from competitive_sudoku.sudoku import GameState, SudokuBoard, Move, TabooMove, load_sudoku_from_text
-from competitive_sudoku.sudokuai import SudokuAI
+from competitive_sudoku.sudokuai import BestMoveSlot, SudokuAI
+from competitive_sudoku.worker import AgentWorker
 
 
 def check_oracle(solve_sudoku_path: str) -> None:
@@ -33,95 +34,115 @@ def check_oracle(solve_sudoku_path: str) -> None:
         print(output)
 
 
-def simulate_game(initial_board: SudokuBoard, player1: SudokuAI, player2: SudokuAI, solve_sudoku_path: str, calculation_time: float = 0.5):
+def simulate_game(initial_board: SudokuBoard, player1: SudokuAI, player2: SudokuAI, solve_sudoku_path: str, calculation_time: float = 0.5, persistent: bool = False):
     """
     Simulates a game between two instances of SudokuAI, starting in initial_board. The first move is played by player1.
     @param initial_board: The initial position of the game.
     @param player1: The AI of the first player.
     @param player2: The AI of the second player.
     @param solve_sudoku_path: The location of the oracle executable.
-    @param calculation_time: The amount of time in seconds for computing the best move.
+    @param calculation_time: The amount of time in seconds for computing the best move. The game continues as soon
+    as the player returns from compute_best_move.
+    @param persistent: If True, every player runs in a long-lived worker process during the whole game, instead of in
+    a new process for every move. This way the state of a player survives between its moves.
     """
     import copy
-    N = initial_board.N
 
     game_state = GameState(initial_board, copy.deepcopy(initial_board), [], [], [0, 0])
-    move_number = 0
-    number_of_moves = initial_board.squares.count(SudokuBoard.empty)
     print('Initial state')
     print(game_state)
 
-    with multiprocessing.Manager() as manager:
-        # use a lock to protect assignments to best_move
-        lock = multiprocessing.Lock()
-        player1.lock = lock
-        player2.lock = lock
-
-        # use shared variables to store the best move
-        player1.best_move = manager.list([0, 0, 0])
-        player2.best_move = manager.list([0, 0, 0])
-
-        while move_number < number_of_moves:
-            player, player_number = (player1, 1) if len(game_state.moves) % 2 == 0 else (player2, 2)
-            print(f'-----------------------------\nCalculate a move for player {player_number}')
-            player.best_move[0] = 0
-            player.best_move[1] = 0
-            player.best_move[2] = 0
-            try:
+    # use a lock to protect assignments to best_move
+    lock = multiprocessing.Lock()
+    player1.lock = lock
+    player2.lock = lock
+
+    # use shared memory to store the best move, it is updated without messages to a manager process
+    player1.best_move = BestMoveSlot()
+    player2.best_move = BestMoveSlot()
+
+    workers = {1: AgentWorker(player1), 2: AgentWorker(player2)} if persistent else {}
+    try:
+        return _play(game_state, player1, player2, solve_sudoku_path, calculation_time, lock, workers)
+    finally:
+        for worker in workers.values():
+            worker.close()
+
+
+def _play(game_state: GameState, player1: SudokuAI, player2: SudokuAI, solve_sudoku_path: str, calculation_time: float, lock, workers):
+    """
+    Plays the moves of a game that is set up by simulate_game.
+    @return: 1 if player 1 wins, -1 if player 2 wins, and 0 in case of a draw.
+    """
+    move_number = 0
+    number_of_moves = game_state.initial_board.squares.count(SudokuBoard.empty)
+
+    while move_number < number_of_moves:
+        player, player_number = (player1, 1) if len(game_state.moves) % 2 == 0 else (player2, 2)
+        print(f'-----------------------------\nCalculate a move for player {player_number}')
+        player.best_move[0] = 0
+        player.best_move[1] = 0
+        player.best_move[2] = 0
+        try:
+            player.deadline = time.time() + calculation_time
+            if workers:
+                workers[player_number].compute_best_move(game_state, calculation_time, lock)
+            else:
                 process = multiprocessing.Process(target=player.compute_best_move, args=(game_state,))
                 process.start()
-                time.sleep(calculation_time)
+                # Wait until the player is done, or until the calculation time is over
+                process.join(calculation_time)
                 lock.acquire()
                 process.terminate()
                 lock.release()
-            except Exception as err:
-                print('Error: an exception occurred.\n', err)
-            i, j, value = player.best_move
-            best_move = Move(i, j, value)
-            print(f'Best move: {best_move}')
-            player_score = 0
-            if best_move != Move(0, 0, 0):
-                if TabooMove(i, j, value) in game_state.taboo_moves:
-                    print(f'Error: {best_move} is a taboo move. Player {2-player_number} wins the game.')
-                    return 1 if player_number == 2 else -1
-                board_text = str(game_state.board)
-                options = f'--move "{game_state.board.rc2f(i, j)} {value}"'
-                output = solve_sudoku(solve_sudoku_path, board_text, options)
-                if 'Invalid move' in output:
-                    print(f'Error: {best_move} is not a valid move. Player {3-player_number} wins the game.')
-                    return 1 if player_number == 2 else -1
-                if 'Illegal move' in output:
-                    print(f'Error: {best_move} is not a legal move. Player {3-player_number} wins the game.')
-                    return 1 if player_number == 2 else -1
-                if 'has no solution' in output:
-                    print(f'The sudoku has no solution after the move {best_move}.')
-                    player_score = 0
-                    game_state.moves.append(TabooMove(i, j, value))
-                    game_state.taboo_moves.append(TabooMove(i, j, value))
-                if 'The score is' in output:
-                    match = re.search(r'The score is ([-\d]+)', output)
-                    if match:
-                        player_score = int(match.group(1))
-                        game_state.board.put(i, j, value)
-                        game_state.moves.append(best_move)
-                        move_number = move_number + 1
-                    else:
-                        raise RuntimeError(f'Unexpected output of sudoku solver: "{output}".')
-            else:
-                print(f'No move was supplied. Player {3-player_number} wins the game.')
+        except Exception as err:
+            print('Error: an exception occurred.\n', err)
+        i, j, value = player.best_move
+        best_move = Move(i, j, value)
+        print(f'Best move: {best_move}')
+        player_score = 0
+        if best_move != Move(0, 0, 0):
+            if TabooMove(i, j, value) in game_state.taboo_moves:
+                print(f'Error: {best_move} is a taboo move. Player {2-player_number} wins the game.')
                 return 1 if player_number == 2 else -1
-            game_state.scores[player_number-1] = game_state.scores[player_number-1] + player_score
-            print(f'Reward: {player_score}')
-            print(game_state)
-        if game_state.scores[0] > game_state.scores[1]:
-            print('Player 1 wins the game.')
-            return 1
-        elif game_state.scores[0] == game_state.scores[1]:
-            print('The game ends in a draw.')
-            return 0
-        elif game_state.scores[0] < game_state.scores[1]:
-            print('Player 2 wins the game.')
-            return -1
+            board_text = str(game_state.board)
+            options = f'--move "{game_state.board.rc2f(i, j)} {value}"'
+            output = solve_sudoku(solve_sudoku_path, board_text, options)
+            if 'Invalid move' in output:
+                print(f'Error: {best_move} is not a valid move. Player {3-player_number} wins the game.')
+                return 1 if player_number == 2 else -1
+            if 'Illegal move' in output:
+                print(f'Error: {best_move} is not a legal move. Player {3-player_number} wins the game.')
+                return 1 if player_number == 2 else -1
+            if 'has no solution' in output:
+                print(f'The sudoku has no solution after the move {best_move}.')
+                player_score = 0
+                game_state.moves.append(TabooMove(i, j, value))
+                game_state.taboo_moves.append(TabooMove(i, j, value))
+            if 'The score is' in output:
+                match = re.search(r'The score is ([-\d]+)', output)
+                if match:
+                    player_score = int(match.group(1))
+                    game_state.board.put(i, j, value)
+                    game_state.moves.append(best_move)
+                    move_number = move_number + 1
+                else:
+                    raise RuntimeError(f'Unexpected output of sudoku solver: "{output}".')
+        else:
+            print(f'No move was supplied. Player {3-player_number} wins the game.')
+            return 1 if player_number == 2 else -1
+        game_state.scores[player_number-1] = game_state.scores[player_number-1] + player_score
+        print(f'Reward: {player_score}')
+        print(game_state)
+    if game_state.scores[0] > game_state.scores[1]:
+        print('Player 1 wins the game.')
+        return 1
+    elif game_state.scores[0] == game_state.scores[1]:
+        print('The game ends in a draw.')
+        return 0
+    elif game_state.scores[0] < game_state.scores[1]:
+        print('Player 2 wins the game.')
+        return -1
 
 
 def main():
@@ -139,8 +160,13 @@ def main():
     cmdline_parser.add_argument('--check', help="check if the solve_sudoku program works", action='store_true')
     cmdline_parser.add_argument('--board', metavar='FILE', type=str, help='a text file containing the start position')
     cmdline_parser.add_argument('--trials', type=int, help='amount of runs', default=1)
+    cmdline_parser.add_argument('--python-oracle', help="use the in-process python oracle instead of the solve_sudoku program", action='store_true')
+    cmdline_parser.add_argument('--persistent', help="run every player in a long-lived worker process instead of a new process per move", action='store_true')
     args = cmdline_parser.parse_args()
 
+    if args.python_oracle:
+        solve_sudoku_path = None
+
     if args.check:
         check_oracle(solve_sudoku_path)
         return
@@ -171,12 +197,12 @@ def main():
             print("we are player 1 in this case")
             # simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path, calculation_time=args.time)
             result = int(simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path,
-                                       calculation_time=args.time))
+                                       calculation_time=args.time, persistent=args.persistent))
             results.append(result)
         elif i % 2 != 0:
             print("we are player 2 in this case")
             result = -int(simulate_game(board, player2, player1, solve_sudoku_path=solve_sudoku_path,
-                                        calculation_time=args.time))
+                                        calculation_time=args.time, persistent=args.persistent))
             results.append(result)
         print("this was trial number:", i+1, "\n -----------------")
         i += 1
@@ -0,0 +1,54 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from pathlib import Path
+from typing import Optional
+
+from competitive_sudoku.openingbook import OpeningBook
+from competitive_sudoku.sudoku import GameState, Move, SudokuBoard
+import team36_A2_taboo.sudokuai
+
+# The opening books, they are built with build_opening_book.py
+BOOK_DIRECTORY = Path(__file__).resolve().parent / 'books'
+
+# The book is only consulted during the first BOOK_MOVES moves of a game
+BOOK_MOVES = 8
+
+
+class SudokuAI(team36_A2_taboo.sudokuai.SudokuAI):
+    """
+    Sudoku AI that plays the moves of an opening book, and that searches like team36_A2_taboo after the opening.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # The books are opened in the process that computes the moves, since memory maps cannot be pickled
+        self.books = None
+
+    def book_move(self, game_state: GameState) -> Optional[Move]:
+        """
+        Looks up the position in the opening books.
+        @param game_state: Current Game state.
+        @return: A legal move that is not taboo, or None if the position is not in a book.
+        """
+        if len(game_state.moves) >= BOOK_MOVES:
+            return None
+        if self.books is None:
+            self.books = [OpeningBook(str(filename)) for filename in sorted(BOOK_DIRECTORY.glob('*.book'))]
+        board = game_state.board
+        for book in self.books:
+            move = book.lookup(board)
+            if move is not None and board.get(move.i, move.j) == SudokuBoard.empty \
+                    and board.candidates(move.i, move.j) >> (move.value - 1) & 1 and move not in game_state.taboo_moves:
+                return move
+        return None
+
+    def compute_best_move(self, game_state: GameState) -> None:
+        move = self.book_move(game_state)
+        if move is not None:
+            self.propose_move(move)
+            print(f"Opening book: Best move: {move}")
+            return
+        super().compute_best_move(game_state)
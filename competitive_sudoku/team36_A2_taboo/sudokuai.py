@@ -2,14 +2,74 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import multiprocessing
 import random
+import time
 
-from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, TabooMove
+from competitive_sudoku.sudoku import BitSudokuBoard, GameState, Move, SudokuBoard, TabooMove, mask_values, \
+    move_table
 import competitive_sudoku.sudokuai
+from competitive_sudoku.candidates import CandidateTracker
+from competitive_sudoku.endgame import EndgameSolver
+from competitive_sudoku.movelist import MoveList, decode_move
+from competitive_sudoku.ordering import MoveOrdering
+from competitive_sudoku.parallel import WorkerPool, fork_available
+from competitive_sudoku.peers import peer_table
+from competitive_sudoku.symmetry import SymmetryCache
+from competitive_sudoku.timemanager import TimeManager
+from competitive_sudoku.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, SharedTranspositionTable, \
+    TranspositionTable, taboo_moves_key
 
 MAX_DEPTH = 50
 END_GAME = 21
 
+# Positions with at most EXACT_ENDGAME empty squares and EXACT_ENDGAME_SOLUTIONS solutions are solved exactly
+EXACT_ENDGAME = 12
+EXACT_ENDGAME_SOLUTIONS = 8
+
+# The exact end game search gets at most this fraction of the time that is left for the move. If it does not finish,
+# the iterative deepening continues in the remaining time.
+EXACT_ENDGAME_TIME = 0.5
+
+# Nodes with at least SYMMETRY_DEPTH plies to search and at most SYMMETRY_FILLED filled squares share their results
+# with symmetric positions, like the positions after the first moves on an empty board
+SYMMETRY_DEPTH = 2
+SYMMETRY_FILLED = 12
+
+# Fill in naked and hidden singles when checking if a position in the end game is unsolvable. This finds dead ends
+# earlier, but in our measurements the extra work per node costs more time than it saves.
+PROPAGATE_SINGLES = False
+
+# The number of worker processes that search the root moves in parallel. With less than two workers, or on platforms
+# that cannot fork, the search runs in the process of the player.
+PARALLEL_WORKERS = 0
+
+# The number of Lazy SMP helper processes. Helpers run the same iterative deepening as the player, with a different
+# move ordering and depth, and they share their results through a transposition table in shared memory. Only the
+# player proposes moves. It is not combined with PARALLEL_WORKERS.
+LAZY_SMP_HELPERS = 0
+
+# Nodes with at least ORDERING_DEPTH plies to search order their moves with killer moves and the history heuristic.
+# The other nodes keep the order in which the moves are generated, which gave smaller searches in our measurements.
+ORDERING_DEPTH = 2
+
+# Search the moves after the first one with a null window, and only search them again with the full window if they
+# are better (principal variation search)
+PRINCIPAL_VARIATION_SEARCH = True
+
+# Every iteration starts with a window of ASPIRATION_WINDOW around the evaluation of the previous iteration, and
+# searches again with the full window if the evaluation falls outside. 0 searches with the full window.
+ASPIRATION_WINDOW = 1
+
+# An iteration is only started if at least TIME_CONFIDENCE times its predicted duration is left before the deadline of
+# the move. Otherwise the move is proposed right away, since an unfinished iteration does not improve it. 0 starts
+# every iteration, until the player is stopped.
+TIME_CONFIDENCE = 0.5
+
+# Zobrist keys for the player to move and for taboo detection, which are combined with the hash of the board
+MIN_PLAYER_KEY = 0x9E3779B97F4A7C15
+TABOO_KEY = 0xC2B2AE3D27D4EB4F
+
 class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
     """
     Sudoku AI that computes a move for a given sudoku configuration.
@@ -22,9 +82,54 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 
         self.taboo_moves= []
 
+        self.transposition_table = TranspositionTable()
+
+        self.symmetry_cache = SymmetryCache(max_filled=SYMMETRY_FILLED)
+
+        # The memo of the end game solver is kept between moves
+        self.endgame_solver = EndgameSolver(max_solutions=EXACT_ENDGAME_SOLUTIONS)
+
+        # The killer moves and history scores of the interior nodes, it is created for the board size of the game
+        self.move_ordering = None
+
     def compute_best_move(self, game_state: GameState) -> None:
 
         N = game_state.board.N
+        m = game_state.board.m
+        n = game_state.board.n
+
+        # The interned moves of the board size, indexed by the code of a move
+        moves_table = move_table(N)
+
+        # The moves that become illegal after a move, indexed by the code of the move
+        peers = peer_table(m, n)
+
+        # Forget the results of the previous turn, the player may be kept alive between moves
+        self.last_moves = []
+        self.taboo_moves = []
+
+        # Keep incremental row/column/block bookkeeping, so legality and scoring are constant time
+        game_state.board = BitSudokuBoard.from_board(game_state.board)
+
+        # The index of the player in game_state.scores, and the score difference at the start of the turn
+        player = game_state.current_player() - 1
+        initial_score = game_state.scores[player] - game_state.scores[1 - player]
+
+        # The transposition table of the turn, which is shared with the worker processes of a parallel search
+        transposition_table = self.transposition_table
+        transposition_table.new_search()
+
+        # The key of the taboo moves of the game, which is combined with the keys of all positions of the turn
+        game_taboo_key = taboo_moves_key(game_state.board, game_state.taboo_moves)
+
+        # Symmetric positions only share results if the game has no taboo moves, since the symmetries do not map them.
+        # The results of earlier turns are forgotten.
+        self.symmetry_cache.clear()
+        use_symmetry = not game_state.taboo_moves
+
+        if self.move_ordering is None or self.move_ordering.N != N:
+            self.move_ordering = MoveOrdering(N)
+        self.move_ordering.new_search()
 
         def possible(i, j, value):
             """
@@ -49,16 +154,12 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
             @param j: Column coordinate of the square
             """
 
-            values = get_surrounding_values(i, j, game_state)
-
-            return [value for value in range(1, N + 1) if value not in values]
+            return mask_values(game_state.board.candidates(i, j))
 
         def completions(i, j, game_state: GameState):
-            complete_row = len(get_row(i, game_state)) == game_state.board.N - 1
-            complete_column = len(get_column(j, game_state)) == game_state.board.N - 1
-            complete_box = len(get_block(i, j, game_state)) == game_state.board.N - 1
+            empty_row, empty_column, empty_box = game_state.board.region_empty_counts(i, j)
 
-            return complete_row, complete_column, complete_box
+            return empty_row == 1, empty_column == 1, empty_box == 1
 
         def two_completions(i, j, game_state: GameState):
             """
@@ -93,32 +194,109 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                     boolean (bool): Returns a bool indicating if the move completes at least one row/column/box
 
             """
-            complete_row = len(get_row(i, game_state)) == game_state.board.N - 1
-            complete_column = len(get_column(j, game_state)) == game_state.board.N - 1
-            complete_box = len(get_block(i, j, game_state)) == game_state.board.N - 1
+            complete_row, complete_column, complete_box = completions(i, j, game_state)
 
             if complete_row or complete_column or complete_box:
                 return True
             else:
                 return False
 
-        def minimax(game_state: GameState, depth: int, alpha: float, beta: float, isMaximisingPlayer: bool, current_score: int, empty_squares: list, all_moves: list, initial=False, taboo=False):
+        def current_score():
+            """
+            Returns the score difference between the player and the opponent, relative to the start of the turn.
+            """
+            return game_state.scores[player] - game_state.scores[1 - player] - initial_score
+
+        def store(key, symmetry_key, depth, value, move, alpha, beta):
+            """
+            Stores the result of a search in the transposition table. The value is stored relative to the score at
+            the node, such that it does not depend on the moves that were played to reach the position.
+
+            @param key: Hash of the position
+            @param symmetry_key: Key of the position in the symmetry cache, or None
+            @param depth: The depth of the search
+            @param value: The evaluation score of the position
+            @param move: The best move in the position
+            @param alpha: The value of alpha at the start of the search
+            @param beta: The value of beta at the start of the search
+            """
+            if value <= alpha:
+                bound = UPPER_BOUND
+            elif value >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            transposition_table.store(key, depth, bound, value - current_score(), move)
+            if symmetry_key is not None:
+                self.symmetry_cache.store(symmetry_key, depth, bound, value - current_score())
+
+        def minimax(game_state: GameState, depth: int, alpha: float, beta: float, isMaximisingPlayer: bool, all_moves: list, initial=False, taboo=False, ply=0):
             """
             The minimax algorithm creates a tree with nodes that includes the current evaluation score of every
             possible move. By applying alpha-beta pruning to minimax, its efficiency is improved by ignoring
-            calculating the evaluation score of nodes that do not affect the final solution.
+            calculating the evaluation score of nodes that do not affect the final solution. Moves are played and
+            undone with game_state.push and game_state.pop, which also keep track of the scores and empty squares.
 
             @param game_state: Current Game state.
             @param depth: The depth of the searching tree.
             @param alpha: The value of the alpha of alpha-beta pruning.
             @param beta: The value of the beta of alpha-beta pruning.
             @param isMaximisingPlayer: Indicates if the player is the Max player (True) or not (False)
-            @param current_score: The current evaluation score of the game.
-            @param empty_squares: The number of empty squares.
+            @param all_moves: The encoded moves that need investigation.
+            @param ply: The distance of the node from the root.
+            @return: The code of the best move and its evaluation score.
             """
             # Return the current score if the depth level equals to 0 or if there are no other moves
             if depth == 0 or len(all_moves) == 0:
-                return None, current_score
+                return None, current_score()
+
+            # Look up the position in the transposition table. Positions are often reached by different move orders.
+            alpha_start, beta_start = alpha, beta
+            key = game_state.board.hash ^ game_taboo_key
+            if not isMaximisingPlayer:
+                key ^= MIN_PLAYER_KEY
+            if taboo:
+                key ^= TABOO_KEY
+            entry = None if initial else transposition_table.lookup(key)
+            hash_move = None
+            if entry is not None:
+                _, entry_depth, bound, value, hash_move, _ = entry
+                if entry_depth >= depth:
+                    value += current_score()
+                    if bound == EXACT:
+                        return hash_move, value
+                    elif bound == LOWER_BOUND:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return hash_move, value
+
+            # Look up the result of a symmetric position. Only the value is stored, since the moves differ.
+            symmetry_key = None
+            if use_symmetry and not initial and depth >= SYMMETRY_DEPTH:
+                symmetry_key = self.symmetry_cache.key(game_state.board, 2 * isMaximisingPlayer + taboo)
+            if symmetry_key is not None:
+                entry = self.symmetry_cache.lookup(symmetry_key)
+                if entry is not None and entry[0] >= depth:
+                    _, bound, value = entry
+                    value += current_score()
+                    if bound == EXACT:
+                        return None, value
+                    elif bound == LOWER_BOUND:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        return None, value
+
+            # Search the best move of an earlier search first, then the killer moves of the ply and the moves with the
+            # best history. The root moves are ordered by the previous iteration.
+            if not initial:
+                if depth >= ORDERING_DEPTH:
+                    all_moves = MoveList(m, n, self.move_ordering.order(all_moves, ply, hash_move))
+                elif hash_move is not None and hash_move in all_moves:
+                    all_moves = MoveList(m, n, [hash_move] + [code for code in all_moves if code != hash_move])
 
             taboo_count = 0
 
@@ -128,58 +306,54 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 # Add the lowest possible value in max_eval
                 max_eval = float('-inf')
 
-                for move in all_moves:
+                for code in all_moves:
+                    move = moves_table[code]
 
-                    # Get the score of the move by calling the score_move function
-                    move_score = score_move(move, game_state)
+                    new_moves = MoveList(m, n, peers.update_codes(all_moves, code))
 
-                    new_moves = update_moves(all_moves, move.i, move.j, move.value)
-                    
-                    # Remove this move from the empty squared table
-                    empty_squares.remove((move.i, move.j))
+                    # Add the move on the board, update the score and remove the square from the empty squares
+                    game_state.push(move)
+                    candidates.push(code)
 
-                    if taboo and unsolvable(empty_squares, new_moves):
+                    if taboo and candidates.unsolvable(PROPAGATE_SINGLES):
                         
                         if initial:
-                            if move not in self.taboo_moves:
-                                self.taboo_moves.append(move)
+                            if code not in self.taboo_moves:
+                                self.taboo_moves.append(code)
 
                         else:
                             taboo_count += 1
                             
-                        empty_squares.add((move.i, move.j))
+                        game_state.pop()
+                        candidates.pop()
 
                         continue
 
-
-                    # Add the score of the move in the current score
-                    current_score += move_score
-
-
-                    # Add the move on the board
-                    game_state.board.put(move.i, move.j, move.value)
-
-                    
                     # Call the minimax function. Decrease the depth and indicate that since this player is the Max the other
-                    # player should be the Min (False). Save the result in the current_eval attribute.
-                    current_eval = minimax(game_state, depth - 1, alpha, beta, False, current_score, empty_squares, new_moves,taboo= taboo)[1]
-
-                    # Subtract the move score from current score
-                    current_score -= move_score
+                    # player should be the Min (False). Save the result in the current_eval attribute. Once a move has
+                    # been evaluated, the other moves are first tested with a null window.
+                    if PRINCIPAL_VARIATION_SEARCH and max_eval > float('-inf'):
+                        current_eval = minimax(game_state, depth - 1, alpha, alpha + 1, False, new_moves, taboo=taboo,
+                                               ply=ply + 1)[1]
+                        if alpha < current_eval < beta and current_eval != 999:
+                            current_eval = minimax(game_state, depth - 1, alpha, beta, False, new_moves, taboo=taboo,
+                                                   ply=ply + 1)[1]
+                    else:
+                        current_eval = minimax(game_state, depth - 1, alpha, beta, False, new_moves, taboo=taboo,
+                                               ply=ply + 1)[1]
+
+                    # Undo the move
+                    game_state.pop()
+                    candidates.pop()
 
-                    # Add the move score from the empty table
-                    empty_squares.add((move.i, move.j))
-
-                    # Remove the move score from the board
-                    game_state.board.put(move.i, move.j, SudokuBoard.empty)
                     if initial:
-                        self.last_moves.append([current_eval,move])
+                        self.last_moves.append([current_eval,code])
 
                     if float(current_eval) == 999:
                         taboo_count += 1
 
                         if initial:
-                            self.taboo_moves.append(move)
+                            self.taboo_moves.append(code)
 
                         continue
     
@@ -187,7 +361,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                     # Save in max_eval and in best_move the highest evaluation score and its move respectively
                     if float(current_eval) > max_eval:
                         max_eval = current_eval
-                        best_move = move
+                        best_move = code
 
 
                     # Save the max evaluation score in alpha and if the max evaluation is larger than beta which is the min
@@ -196,13 +370,17 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                     
                     if max_eval >= beta:
                         if initial:
-                            self.last_moves.append([current_eval,move])
+                            self.last_moves.append([current_eval,code])
+                        self.move_ordering.cutoff(code, ply, depth)
                         break;
 
 
                 if taboo_count == len(all_moves):
                     return None, 999
 
+                if not initial:
+                    store(key, symmetry_key, depth, max_eval, best_move, alpha_start, beta_start)
+
                 # Return the best move and its evaluation score
                 return best_move, max_eval
 
@@ -211,44 +389,38 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 # Add the highest possible value in max_eval
                 min_eval = float('inf')
 
-                for move in all_moves:
+                for code in all_moves:
+                    move = moves_table[code]
 
+                    new_moves = MoveList(m, n, peers.update_codes(all_moves, code))
 
-                    # Remove this move from the empty squared table
-                    empty_squares.remove((move.i, move.j))
+                    # Add the move on the board, update the score and remove the square from the empty squares
+                    game_state.push(move)
+                    candidates.push(code)
 
-                    new_moves = update_moves(all_moves, move.i, move.j, move.value)
-
-                    if  taboo and unsolvable(empty_squares, new_moves):
+                    if taboo and candidates.unsolvable(PROPAGATE_SINGLES):
                         taboo_count += 1
-                        empty_squares.add((move.i, move.j))
+                        game_state.pop()
+                        candidates.pop()
 
                         continue
 
-                    # Get the score of the move by calling the score_move function
-                    move_score = score_move(move, game_state)
-
-                    # Subtract the score of the move in the current score
-                    current_score -= move_score
-
-
-                    # Add the move on the board
-                    game_state.board.put(move.i, move.j, move.value)
-
- 
                     # Call the minimax function. Decrease the depth and indicate that since this player is the Min the other
-                    # player should be the Max (True). Save the result in the current_eval attribute.
-                    current_eval = minimax(game_state, depth - 1, alpha, beta, True, current_score, empty_squares, new_moves, taboo=taboo)[1]
-
-                    # Add the score of the move in the current score
-                    current_score += move_score
-
-                    # Add the move score to the empty table
-                    empty_squares.add((move.i, move.j))
-
-                    # Remove the move score from the board
-                    game_state.board.put(move.i, move.j, SudokuBoard.empty)
-
+                    # player should be the Max (True). Save the result in the current_eval attribute. Once a move has
+                    # been evaluated, the other moves are first tested with a null window.
+                    if PRINCIPAL_VARIATION_SEARCH and min_eval < float('inf'):
+                        current_eval = minimax(game_state, depth - 1, beta - 1, beta, True, new_moves, taboo=taboo,
+                                               ply=ply + 1)[1]
+                        if alpha < current_eval < beta and current_eval != 999:
+                            current_eval = minimax(game_state, depth - 1, alpha, beta, True, new_moves, taboo=taboo,
+                                                   ply=ply + 1)[1]
+                    else:
+                        current_eval = minimax(game_state, depth - 1, alpha, beta, True, new_moves, taboo=taboo,
+                                               ply=ply + 1)[1]
+
+                    # Undo the move
+                    game_state.pop()
+                    candidates.pop()
 
                     if float(current_eval) == 999:
                         taboo_count += 1
@@ -257,12 +429,13 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                     # Save in min_eval and in best_move the lowest evaluation score and its move respectively
                     if float(current_eval) < min_eval:
                         min_eval = current_eval
-                        best_move = move
+                        best_move = code
 
                     # Save the min evaluation score in beta and if the min evaluation is smaller than alpha which is the max
                     # evaluation score there is no need to investigate the tree further
                     beta = min(beta, min_eval)
                     if min_eval <= alpha:
+                        self.move_ordering.cutoff(code, ply, depth)
                         break;
 
                 # If there 
@@ -270,60 +443,214 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 if taboo_count == len(all_moves):
                     return None, 999
 
+                if not initial:
+                    store(key, symmetry_key, depth, min_eval, best_move, alpha_start, beta_start)
+
                 # Return the best move and its evaluation score
                 return best_move, min_eval
 
+        def search_root_move(task):
+            """
+            Searches a root move in a worker process. The root moves of the iteration are read from shared memory when
+            a new iteration starts, since the candidates of the search depend on them.
+
+            @param task: The tuple (iteration, depth, taboo, code) of the root move with code.
+            @return: The evaluation score of the move and the alpha it was searched with, or (None, alpha) if the move
+            makes the sudoku unsolvable.
+            """
+            nonlocal candidates, root_moves, worker_iteration
+            iteration, depth, taboo, code = task
+            if iteration != worker_iteration:
+                worker_iteration = iteration
+                root_moves = MoveList(m, n, shared_moves[:shared_moves_count.value])
+                candidates = CandidateTracker(m, n, root_moves, [row * N + column for row, column in empty_squares])
+
+            alpha = shared_alpha.value
+            game_state.push(moves_table[code])
+            candidates.push(code)
+            if taboo and candidates.unsolvable(PROPAGATE_SINGLES):
+                value = None
+            else:
+                new_moves = MoveList(m, n, peers.update_codes(root_moves, code))
+                value = minimax(game_state, depth - 1, alpha, float('inf'), False, new_moves, taboo=taboo, ply=1)[1]
+            game_state.pop()
+            candidates.pop()
+
+            # Share a better alpha with the other workers. Values of at most alpha are upper bounds.
+            if value is not None and value != 999 and value > alpha:
+                with shared_alpha.get_lock():
+                    shared_alpha.value = max(shared_alpha.value, value)
+            return value, alpha
+
+        def parallel_minimax(depth, moves, taboo):
+            """
+            Searches the root like minimax with initial=True, with the root moves distributed over the worker pool.
+            The first move is searched before the others, such that the other moves get the alpha of the best move of
+            the previous iteration (young brothers wait). The results are merged in the order of the moves.
+
+            @return: The code of the best move and its evaluation score.
+            """
+            nonlocal iteration
+            iteration += 1
+            shared_moves[:len(moves)] = list(moves)
+            shared_moves_count.value = len(moves)
+            shared_alpha.value = float('-inf')
+            tasks = [(iteration, depth, taboo, code) for code in moves]
+            results = pool.map(tasks[:1]) + pool.map(tasks[1:])
+
+            best_move = None
+            max_eval = float('-inf')
+            for code, (value, alpha) in zip(moves, results):
+                if value is None:
+                    if code not in self.taboo_moves:
+                        self.taboo_moves.append(code)
+                    continue
+                self.last_moves.append([value, code])
+                if value == 999:
+                    self.taboo_moves.append(code)
+                    continue
+                # Only an exact value can be the best, a move that failed low is at most as good as the alpha
+                if value > alpha and value > max_eval:
+                    max_eval = value
+                    best_move = code
+            if best_move is None:
+                return None, 999
+            return best_move, max_eval
+
+        def helper_search(number):
+            """
+            The iterative deepening of a Lazy SMP helper. Odd helpers search one ply deeper than the player, and every
+            helper starts with a different first root move, such that the helpers and the player search different
+            parts of the tree first. Only the transposition table is shared; the helper never proposes a move.
+
+            @param number: The number of the helper, starting at 1.
+            """
+            nonlocal candidates
+            first = number % len(moves)
+            helper_moves = MoveList(m, n, list(moves)[first:] + list(moves)[:first])
+            for depth in range(1 + number % 2, MAX_DEPTH):
+                if depth > len(empty_squares):
+                    break
+                taboo = END_GAME > len(empty_squares) > 1 and depth > 2
+                candidates = CandidateTracker(m, n, helper_moves, [row * N + column for row, column in empty_squares])
+                minimax(game_state, depth, float('-inf'), float('inf'), True, helper_moves, True, taboo)
+                helper_moves = MoveList(m, n, self.update_best_ordering())
+
         #### MOVE PROPOSITIONING ###
 
-        # Find all legal and non taboo moves
-        all_moves = [Move(i, j, value) for i in range(N) for j in range(N) for value in get_values(i,j) if possible(i, j, value)]
+        # Find all legal and non taboo moves, encoded as integers (i * N + j) * N + value - 1
+        all_moves = MoveList(m, n, [(i * N + j) * N + value - 1 for i in range(N) for j in range(N)
+                                    for value in get_values(i,j) if possible(i, j, value)])
 
         # Propose a random move first in case there is no time to implement minimax.
-        move = random.choice(all_moves)
-        self.propose_move(move)
+        self.propose_move(decode_move(random.choice(all_moves), N))
         
         # @TODO Initial ordering based on if three completions can be made
         moves = []
-        for move in all_moves:
+        for code in all_moves:
+                move = moves_table[code]
                 if three_completions(move.i, move.j, game_state):
-                    moves.insert(0, move)
+                    moves.insert(0, code)
                 else:
-                    moves.append(move)
-
-
-        empty_squares = set([(i, j) for i in range(N) for j in range(N) if game_state.board.get(i, j) == SudokuBoard.empty])
+                    moves.append(code)
+        moves = MoveList(m, n, moves)
+
+
+        empty_squares = game_state.empty_squares
+
+        # Search the root moves in parallel, or let Lazy SMP helpers search along. The workers are forked with the
+        # state of the turn and a transposition table in shared memory. The root splitting workers receive the root
+        # moves of every iteration in shared memory. End games that are solved exactly do not need them.
+        pool = None
+        root_split = False
+        if (PARALLEL_WORKERS > 1 or LAZY_SMP_HELPERS > 0) and fork_available() and len(empty_squares) > EXACT_ENDGAME:
+            transposition_table = SharedTranspositionTable(transposition_table.size)
+            transposition_table.new_search()
+            if PARALLEL_WORKERS > 1:
+                root_split = True
+                candidates = None
+                root_moves = None
+                iteration = 0
+                worker_iteration = 0
+                shared_moves = multiprocessing.RawArray('i', len(moves))
+                shared_moves_count = multiprocessing.RawValue('i', 0)
+                shared_alpha = multiprocessing.Value('d', float('-inf'))
+                pool = WorkerPool(search_root_move, PARALLEL_WORKERS, transposition_table.close)
+            else:
+                pool = WorkerPool(helper_search, LAZY_SMP_HELPERS, transposition_table.close)
+                pool.start(range(1, LAZY_SMP_HELPERS + 1))
 
         # Start with depth 1 and then increase depth. For every depth, call minimax and propose a move. The more time we have
         # the most accurate the move that the minimax returns
-        for i in range(1, MAX_DEPTH):
-            if i > len(empty_squares):
-                break
-
-            # Calculate taboo moves if you are in the end game
-            if len(empty_squares) < END_GAME and len(empty_squares) > 1 and i > 2:
-                taboo = True
-            else:
-                taboo = False
+        time_manager = TimeManager(self.deadline, TIME_CONFIDENCE)
+        try:
+            for i in range(1, MAX_DEPTH):
+                if i > len(empty_squares):
+                    break
+                if not time_manager.can_start_iteration():
+                    print(f"Depth {i} is not started, predicted {time_manager.predicted_duration():.3f}s, "
+                          f"remaining {time_manager.remaining_time():.3f}s")
+                    break
 
-            best_move, eval = minimax(game_state, i, float('-inf'), float('inf'), True, 0, empty_squares, moves, True, taboo)
-            self.propose_move(best_move)
+                # Solve the end game exactly, once a first move has been proposed
+                if i == 2 and len(empty_squares) <= EXACT_ENDGAME:
+                    remaining = time_manager.remaining_time()
+                    deadline = None if remaining is None else time.time() + EXACT_ENDGAME_TIME * remaining
+                    result = self.endgame_solver.solve(game_state.board, game_state.taboo_moves, deadline)
+                    if result is not None:
+                        eval, best_move = result
+                        self.propose_move(best_move)
+                        print(f"Exact end game: Best move: {best_move}, score: {eval}, empty: {len(empty_squares)}")
+                        break
+
+                # Calculate taboo moves if you are in the end game
+                if len(empty_squares) < END_GAME and len(empty_squares) > 1 and i > 2:
+                    taboo = True
+                else:
+                    taboo = False
+
+                # The candidates of the empty squares, which are updated together with game_state during the search.
+                # Only the root moves that were not found to be taboo are candidates.
+                candidates = CandidateTracker(m, n, moves, [row * N + column for row, column in empty_squares])
+
+                time_manager.start_iteration()
+                if root_split:
+                    best_move, eval = parallel_minimax(i, moves, taboo)
+                elif ASPIRATION_WINDOW and i > 1 and eval != 999:
+                    # Search with a window around the previous evaluation, and with the full window if the evaluation
+                    # falls outside. The root results of the failed search are forgotten.
+                    taboo_moves_count = len(self.taboo_moves)
+                    alpha, beta = eval - ASPIRATION_WINDOW, eval + ASPIRATION_WINDOW
+                    best_move, eval = minimax(game_state, i, alpha, beta, True, moves, True, taboo)
+                    if best_move is None or not alpha < eval < beta:
+                        self.last_moves = []
+                        del self.taboo_moves[taboo_moves_count:]
+                        best_move, eval = minimax(game_state, i, float('-inf'), float('inf'), True, moves, True, taboo)
+                else:
+                    best_move, eval = minimax(game_state, i, float('-inf'), float('inf'), True, moves, True, taboo)
+                time_manager.end_iteration()
+                best_move = decode_move(best_move, N)
+                self.propose_move(best_move)
 
-            print(f"Taboo: {len(self.taboo_moves)} Depth: {i}, Best move: {best_move}, score: {score_move(best_move, game_state)}, {eval}, empty: {len(empty_squares)}")
+                print(f"Taboo: {len(self.taboo_moves)} Depth: {i}, Best move: {best_move}, score: {score_move(best_move, game_state)}, {eval}, empty: {len(empty_squares)}")
 
-            if self.taboo_moves:
-                taboo_move = self.propose_taboo_move(eval, empty_squares)
+                if self.taboo_moves:
+                    taboo_move = self.propose_taboo_move(eval, empty_squares, N)
 
-                if taboo_move:
-                    self.propose_move(taboo_move)
+                    if taboo_move is not None:
+                        self.propose_move(decode_move(taboo_move, N))
 
-                    break
+                        break
 
             
-            moves = self.update_best_ordering()
+                moves = MoveList(m, n, self.update_best_ordering())
 
-            # #WRITE LATEST  DEPTH to file
-            # with open('experimentsv2.0/saved_ordered2_3x3e.txt', 'a') as f:
-            #         f.write(f",{i}")
+                # #WRITE LATEST  DEPTH to file
+                # with open('experimentsv2.0/saved_ordered2_3x3e.txt', 'a') as f:
+                #         f.write(f",{i}")
+        finally:
+            if pool is not None:
+                pool.close()
 
 
     def update_best_ordering(self):
@@ -333,8 +660,10 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         return moves
 
 
-    def propose_taboo_move(self, eval, empty_squares):
-        ""
+    def propose_taboo_move(self, eval, empty_squares, N):
+        """
+        Returns the code of a taboo move to play instead of the best move, or None.
+        """
         if len(self.taboo_moves) == 0:
             return None
 
@@ -350,7 +679,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         # If you are play on the oneven (winning) side, but there is one taboo move left
         elif len(self.taboo_moves) == 1 and eval < 3:
             taboo_move = self.taboo_moves[0]
-            alternative_moves = [move for eval, move in self.last_moves if (move.i == taboo_move.i) and (move.j == taboo_move.j) and (move.value != taboo_move.value) ]
+            alternative_moves = [code for eval, code in self.last_moves if (code // N == taboo_move // N) and (code != taboo_move) ]
             
             print("counter taboo played")
             return random.choice(alternative_moves)
@@ -365,46 +694,6 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         #         return False
 
 
-def update_moves(all_moves: list, current_i: int, current_j: int, current_value):
-    """
-        Get all possible moves
-
-    """    
-    
-    new_moves = []
-
-    for other_move in all_moves:
-        if (other_move.i,other_move.j) != (current_i, current_j):
-
-            if other_move.i != current_i and other_move.j != current_j:
-                new_moves.append(other_move)
-            
-            elif (other_move.i == current_i and other_move.j != current_j) or (other_move.i != current_i and other_move.j == current_j):
-                
-                if other_move.value != current_value:
-                    new_moves.append(other_move)
-
-    return new_moves
-
-def unsolvable(empty_squares, moves):
-    """
-        Check if any empty square does not have any moves to be made
-    """
-    
-    for square_i, square_j in empty_squares:
-        solutions = 0
-        
-        for move in moves:
-
-            if move.i == square_i and move.j == square_j:
-
-                solutions += 1
-    # print(e)
-        if solutions == 0:
-            return True
-
-    return False
-
 def score_move(move: Move, game_state: GameState) -> int:
     """The move scoring function calculates if a player will get contributed points
     for a given move. If either a block, column or row is completed 1 point is awarded
@@ -418,9 +707,10 @@ def score_move(move: Move, game_state: GameState) -> int:
             score (int): the score of the move to be played
     """
     score = 0
-    complete_row = len(get_row(move.i, game_state)) == game_state.board.N - 1
-    complete_column = len(get_column(move.j, game_state)) == game_state.board.N - 1
-    complete_box = len(get_block(move.i, move.j, game_state)) == game_state.board.N - 1
+    empty_row, empty_column, empty_box = game_state.board.region_empty_counts(move.i, move.j)
+    complete_row = empty_row == 1
+    complete_column = empty_column == 1
+    complete_box = empty_box == 1
 
     if complete_row and complete_column and complete_box:
         score += 7
@@ -432,83 +722,3 @@ def score_move(move: Move, game_state: GameState) -> int:
         score += 1
     return score
 
-
-def get_surrounding_values(i: int, j: int, game_state: GameState):
-    """
-    Retrieve which values are in the block, row and column of
-    a given square.
-
-    Parameters:
-            i: Row coordinate of the square
-            j: Column coordinate of the square
-            game_state: The current game state (board)
-
-        Returns:
-            values: the values in the block, row, column surrounding a square
-    """
-
-    values = set()
-
-    # Get values in row
-    values.update(get_row(i, game_state))
-    if len(values) == game_state.board.N:
-        return values
-
-    # Get values in column
-    values.update(get_column(j, game_state))
-    if len(values) == game_state.board.N:
-        return values
-
-    # Get values in block
-    values.update(get_block(i, j, game_state))
-
-    return values
-
-
-def get_column(j: int, game_state: GameState):
-    """Retrieve the values in a certain column with coordinate j
-
-        Parameters:
-            j: Column coordinate of the square
-            game_state: The current game state (board)
-
-        Returns:
-            values: The values in the column
-    """
-    values = [game_state.board.get(z, j) for z in range(game_state.board.N) if
-              game_state.board.get(z, j) != SudokuBoard.empty]
-    return values
-
-
-def get_row(i: int, game_state: GameState):
-    """Retrieve the values in a certain row with coordinate i
-
-        Parameters:
-            i: Column coordinate of the square
-            game_state: The current game state (board)
-
-        Returns:
-            values: The values in the column
-    """
-    values = [game_state.board.get(i, z) for z in range(game_state.board.N) if
-              game_state.board.get(i, z) != SudokuBoard.empty]
-    return values
-
-
-def get_block(i: int, j: int, game_state: GameState):
-    """Get all values in a block with coordinates (i, j)
-
-        Parameters:
-            i: Row number of a square in the block
-            j: Column number of a square in the block
-            game_state: The current game state (board)
-
-        Returns:
-            values: The values in the block
-    """
-
-    i_start = int(i / game_state.board.m) * game_state.board.m
-    j_start = int(j / game_state.board.n) * game_state.board.n
-    values = [game_state.board.get(x, y) for x in range(i_start, i_start + game_state.board.m) for y in
-              range(j_start, j_start + game_state.board.n) if game_state.board.get(x, y) != SudokuBoard.empty]
-    return values
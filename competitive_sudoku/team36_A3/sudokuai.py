@@ -7,6 +7,7 @@ import math
 
 from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, TabooMove
 import competitive_sudoku.sudokuai
+from competitive_sudoku.peers import peer_table
 
 END_GAME = 21
 
@@ -103,6 +104,9 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         if iterations == 0 or len(all_moves) == 0:
             return
 
+        # The peers of every square, used to remove the moves that become illegal after a move
+        peers = peer_table(game_state.board.m, game_state.board.n)
+
         # Reduce number of iterations
         iterations = iterations - 1
         print(iterations)
@@ -134,7 +138,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 move_score = move_score - score_move(move, gameCopy)
                 isotheragent = False
             gameCopy.board.put(move.i, move.j, move.value)
-            nextMoves = update_moves(all_moves, move.i, move.j, move.value)
+            nextMoves = peers.update_moves(all_moves, move.i, move.j, move.value)
             while nextMoves:
                 next_random_move = random.choice(nextMoves)
                 if isotheragent:
@@ -144,7 +148,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                     move_score = move_score + score_move(next_random_move, gameCopy)
                     isotheragent = True
                 gameCopy.board.put(next_random_move.i, next_random_move.j, next_random_move.value)
-                nextMoves = update_moves(nextMoves, next_random_move.i, next_random_move.j, next_random_move.value)
+                nextMoves = peers.update_moves(nextMoves, next_random_move.i, next_random_move.j, next_random_move.value)
                 # print("played a random move")
 
             if firstRound:
@@ -166,7 +170,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
             gameCopy = game_state
             initial_move = best_move
             gameCopy.board.put(best_move.i, best_move.j, best_move.value)
-            updated_moves = update_moves(all_moves, best_move.i, best_move.j, best_move.value)
+            updated_moves = peers.update_moves(all_moves, best_move.i, best_move.j, best_move.value)
             self.propose_move(best_move)
             self.monte_carlo(gameCopy, game_state, updated_moves,max_score,False,evaluations, initial_move , iterations, start, max_score)
         else:
@@ -180,7 +184,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                         break;
                 gameCopy = game_state
                 gameCopy.board.put(best_move.i, best_move.j, best_move.value)
-                updated_moves = update_moves(all_moves, best_move.i, best_move.j, best_move.value)
+                updated_moves = peers.update_moves(all_moves, best_move.i, best_move.j, best_move.value)
                 self.propose_move(initial_move)
                 self.monte_carlo(gameCopy, initial_game_state, updated_moves, max_score, False, evaluations, initial_move, iterations, start, round_max_score)
             else:
@@ -204,7 +208,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 
                 gameCopy = initial_game_state
                 gameCopy.board.put(new_best_move.i, new_best_move.j, new_best_move.value)
-                updated_moves = update_moves(all_moves, new_best_move.i, new_best_move.j, new_best_move.value)
+                updated_moves = peers.update_moves(all_moves, new_best_move.i, new_best_move.j, new_best_move.value)
 
                 # Propose the new best move that the agent founds
                 self.propose_move(new_best_move)
@@ -214,35 +218,6 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 #       INFORMATION ON THE MOVES               #
 ######                                    ######
 
-def update_moves(all_moves: list, current_i: int, current_j: int, current_value):
-    """
-    Updates the list of moves by creating a new list that doesn't include the illegal moves that are
-    generated after applying a move.
-
-    @param all_moves: List of all moves
-    @param current_i: Row coordinate of the move
-    @param current_j: Column coordinate of the move
-    @param current_value: Value of the current move
-    """
-
-    new_moves = []
-
-    for other_move in all_moves:
-        if (other_move.i, other_move.j) != (current_i, current_j):
-
-            if other_move.i != current_i and other_move.j != current_j:
-                new_moves.append(other_move)
-
-            elif (other_move.i == current_i and other_move.j != current_j) or (
-                other_move.i != current_i and other_move.j == current_j
-            ):
-
-                if other_move.value != current_value:
-                    new_moves.append(other_move)
-
-    return new_moves
-
-
 def score_move(move: Move, game_state: GameState) -> int:
     """The move scoring function calculates if a player will get contributed points
     for a given move. If either a block, column or row is completed 1 point is awarded
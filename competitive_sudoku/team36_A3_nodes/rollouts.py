@@ -0,0 +1,91 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import random
+import numpy as np
+from competitive_sudoku.sudoku import GameState, SudokuBoard
+from competitive_sudoku.peers import peer_table
+
+# The reward of a move that completes zero, one, two or three regions
+REGION_SCORES = np.array(GameState.region_scores)
+
+
+class RolloutEngine(object):
+    """
+        Plays random games in parallel with NumPy. The moves that can still be played in every game are stored in a
+        boolean array with a row per game and a column per move code (i * N + j) * N + value - 1. In every ply each
+        game that is not finished plays a move that is chosen uniformly among its legal moves, like the rollouts of
+        MCST_Tree.
+
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param seed: The seed of the random generator. By default it is drawn from the random module, such that a game
+        that seeds the random module also replays the same rollouts.
+    """
+
+    def __init__(self, m, n, seed=None):
+        N = m * n
+        self.N = N
+        self.M = N * N * N
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+
+        # The codes of the moves that become illegal after a move, the move itself included. Every move has the same
+        # number of them.
+        self.conflicts = np.array([sorted(conflicts) for conflicts in peer_table(m, n).conflicts], dtype=np.intp)
+
+        # The block of every square
+        squares = np.arange(N * N)
+        self.blocks = (squares // N // m) * m + squares % N // n
+
+    def rollouts(self, board: SudokuBoard, moves, count):
+        """
+        Plays count random games from a position until no moves are left.
+
+        @param board: The position.
+        @param moves: The codes of the moves that can be played in the position.
+        @param count: The number of games.
+        @return: The score differences of the games for the player to move in the position, and a boolean array that
+        tells which games filled the board. Games that end in an unsolvable position have not filled the board.
+        """
+        N = self.N
+        empty = np.array(board.squares).reshape(N, N) == SudokuBoard.empty
+        n_empty = int(empty.sum())
+        row_empty = np.tile(empty.sum(axis=1), (count, 1))
+        column_empty = np.tile(empty.sum(axis=0), (count, 1))
+        block_empty = np.tile(np.bincount(self.blocks, weights=empty.ravel(), minlength=N).astype(np.int64),
+                              (count, 1))
+
+        legal = np.zeros((count, self.M), dtype=bool)
+        legal[:, moves] = True
+        scores = np.zeros(count, dtype=np.int64)
+        played = np.zeros(count, dtype=np.int64)
+        sign = 1
+
+        for _ in range(n_empty):
+            counts = legal.sum(axis=1)
+            games = np.flatnonzero(counts)
+            if not games.size:
+                break
+
+            # Choose a random legal move in every game
+            targets = (self.rng.random(games.size) * counts[games]).astype(np.int64)
+            codes = (np.cumsum(legal[games], axis=1) > targets[:, None]).argmax(axis=1)
+
+            # Update the scores and the empty squares of the regions
+            squares = codes // N
+            rows = squares // N
+            columns = squares % N
+            blocks = self.blocks[squares]
+            completed = (row_empty[games, rows] == 1).astype(np.int64) + (column_empty[games, columns] == 1) \
+                + (block_empty[games, blocks] == 1)
+            scores[games] += sign * REGION_SCORES[completed]
+            row_empty[games, rows] -= 1
+            column_empty[games, columns] -= 1
+            block_empty[games, blocks] -= 1
+            played[games] += 1
+            sign = -sign
+
+            legal[games[:, None], self.conflicts[codes]] = False
+
+        return scores, played == n_empty
@@ -3,171 +3,114 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import random
-import sys
 import numpy as np
-from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, TabooMove
+from competitive_sudoku.sudoku import BitSudokuBoard, GameState, Move, SudokuBoard, TabooMove, move_table
 import competitive_sudoku.sudokuai
-import copy
+from competitive_sudoku.peers import peer_table
+from team36_A3_nodes.rollouts import RolloutEngine
 
 C = 3
 N_simulations = 1000000
 
-class MCST_Node():
+# The number of random games that evaluate a leaf. With more than one, the games are played in parallel by a
+# RolloutEngine and the leaf is visited once for every game. ROLLOUTS = 1 plays a single game in pure Python.
+ROLLOUTS = 16
+
+class MCST_Tree(object):
     """
-        The monte_carlo function searches for the best move by simulating the game. For every game state, it selects
-        a move, its expands it, it simulates the game by choosing random moves to complete it and then it calculates
-        the UCT. Finally, it backpropagates the game by updated the UCT value in every visited node.
-
-        @param gameCopy: Deepcopy of the game state.
-        @param n_empty: Number of empty cells.
-        @param all_moves: List of all moves that needs investigation.
-        @param eval: The total score of a game.
-        @param parent: The parent node.
-        @param move: A move of type Move.
-        @param move_score: The score of a move.
-        @param depth: The depth. Indcated the current agent.
+        The Monte Carlo search tree, stored as a struct of arrays that are indexed by node. Node 0 is the root. A node
+        only stores the move that leads to it; its position is obtained by replaying the moves from the root on the
+        board of the game state. When a node is expanded for the first time, a contiguous block with a slot for every
+        move of the node is reserved for its children, such that UCT is computed with one vectorized expression over
+        the block. The arrays grow geometrically when they are full.
+
+        @param moves: The codes of the moves that can be played in the root. Children are expanded from the end.
+        @param peers: The peer table of the board.
+        @param capacity: The initial number of nodes that fit in the arrays.
     """
 
-    def __init__(self, all_moves, gameCopy, n_empty, eval=0, parent=None, move=None, move_score=0, depth=0):
-        super().__init__()
-        self.move=move
-        self.move_score = move_score
-        self.eval = eval
-        
-        self.parent = parent
-        self.children = []
-
-        self.depth = depth
-
-
-        self.all_moves = all_moves
-        self.unmade_moves = copy.copy(all_moves)
-
-        self.gameCopy = gameCopy
+    def __init__(self, moves, peers, capacity=1 << 12):
+        self.peers = peers
+        self.size = 1
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.move = np.full(capacity, -1, dtype=np.int32)       # The code of the move that leads to the node
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.expanded = np.zeros(capacity, dtype=np.int32)      # The number of children that have been expanded
+        self.visits = np.zeros(capacity)
+        self.values = np.zeros(capacity)                       # The sum of the results of the simulations
 
-        self.results = [0, 0, 0]
-        self.n = 0
-        self.v = 0
+        # The moves of the nodes with children. The moves of a leaf are computed when it is expanded.
+        self.moves = {0: moves}
 
-        self.n_empty = n_empty
-
-    # If start mod 2 is zero then the current agent is not our a3 agent
-        if depth % 2 != 0:
-            self.isa3agent = False
-        else:
-            self.isa3agent = True
-
-    def expand(self):
+    def grow(self, capacity):
         """
-        The agent expands the initial node by finding the children of the node.
+        Enlarges the arrays, such that capacity nodes fit in them.
         """
-        # Select move to expand
-        move = self.unmade_moves.pop()
-        
-        move_score = score_move(move, self.gameCopy)
-
-        # add or substract score based on which player makes move
-        if self.isa3agent:
-            eval = self.eval+move_score
-        else:
-            eval = self.eval-move_score
-
-        nextMoves = update_moves(self.all_moves, move.i, move.j, move.value)
-    
-        gameCopy = copy.deepcopy(self.gameCopy)
-        gameCopy.board.put(move.i, move.j, move.value)
-    
-        # Create new node with updated gamestate and score
-        child = MCST_Node(nextMoves, gameCopy, self.n_empty-1, parent=self, eval=eval, move=move, move_score=move_score, depth=self.depth+1)
-
-        self.children.append(child)
-
-        return child
-    
-    def roll_out(self):
+        for name, fill in (('parent', -1), ('move', -1), ('first_child', -1), ('expanded', 0), ('visits', 0),
+                           ('values', 0)):
+            array = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def node_moves(self, node):
         """
-        The agent simulates the game. A random move from the expansion is chosen and the game from this
-        move is randomly completed.
+        @return: The codes of the moves that can be played in the node.
         """
+        moves = self.moves.get(node)
+        if moves is None:
+            moves = self.peers.update_codes(self.node_moves(int(self.parent[node])), int(self.move[node]))
+        return moves
 
-        nextMoves = self.all_moves
-        move_score = self.eval
-        isplayer = not self.isa3agent
-        
-        board_copy = copy.deepcopy(self.gameCopy)
-
-        # Play random moves till there are no more moves to make
-        while nextMoves:
-            next_random_move = random.choice(nextMoves)
-            
-            # Add or subtract based on who is playing
-            if isplayer:
-                move_score = move_score - score_move(next_random_move, board_copy)
-            else:
-                move_score = move_score + score_move(next_random_move, board_copy)
-
-            isplayer = not isplayer
-
-            board_copy.board.put(next_random_move.i, next_random_move.j, next_random_move.value)
-            nextMoves = update_moves(nextMoves, next_random_move.i, next_random_move.j, next_random_move.value)
-
-        empty_squares = set([(i, j) for i in range(self.gameCopy.board.N) for j in range(self.gameCopy.board.N) if board_copy.board.get(i,j) == SudokuBoard.empty])
-
-        # Return score if game is finished else 0 because of an unsolvable position
-        if len(empty_squares) == 0:
-            return move_score
-        else:
-            return 0
-
-    def backpropagate(self, result):
+    def expand(self, node, moves):
         """
-        The agent backtracks the nodes that it chose to reach the expanded node and updates the UCT values.
+        Expands the next unexpanded move of a node.
 
-        @param result: the results of the rollout.
+        @param node: A node with unexpanded moves.
+        @param moves: The moves of the node.
+        @return: The new child.
         """
-        self.n += 1
-        self.v += result
-
-        if result>0:
-            self.results[1] += 1
-        else:
-            self.results[0] += 1
-
-        if self.parent:
-            self.parent.backpropagate(result)
+        first_child = int(self.first_child[node])
+        if first_child < 0:
+            first_child = self.size
+            self.size += len(moves)
+            if self.size > len(self.parent):
+                self.grow(max(2 * len(self.parent), self.size))
+            self.first_child[node] = first_child
+            self.moves[node] = moves
+        index = int(self.expanded[node])
+        self.expanded[node] = index + 1
+        child = first_child + index
+        self.parent[child] = node
+        self.move[child] = moves[len(moves) - 1 - index]
+        return child
 
-    def UCT(self, C=2):
+    def UCT(self, node, C=2):
         """
-        Calculates the UCT formula and returns the child with highest values. 
-        With C=0, it selects the best performing child (to propose) 
+        Calculates the UCT formula for the expanded children of a node and returns the child with highest values.
+        Every expanded child has been visited at least once. With C=0, it selects the best performing child (to
+        propose)
 
+        @param node: A node with at least one expanded child.
         @param C: Value that determines how much the number of runs punishment weights
-
-
         """
+        first_child = int(self.first_child[node])
+        end = first_child + int(self.expanded[node])
+        visits = self.visits[first_child:end]
+        moves_UCB = self.values[first_child:end] / visits + C * np.sqrt(2 * np.log(self.visits[node]) / visits)
+        return first_child + int(np.argmax(moves_UCB))
 
-        moves_UCB = [(c.v / c.n) + C * np.sqrt((2 * np.log(self.n) / c.n)) if c.n > 0 else float("inf") for c in self.children]
-
-        return self.children[np.argmax(moves_UCB)]
-
-    def select_best_child(self):
+    def backpropagate(self, path, result, count=1):
         """
-        Finds the best child of a parent node.
+        Adds the results of simulations to the nodes on the path from the root.
 
+        @param path: The nodes from the root to the node where the simulations started.
+        @param result: the sum of the results of the rollouts.
+        @param count: the number of rollouts.
         """
-
-        current_node = self
-
-        # Walk through search tree based on UCT, until either
-        # a leaf is found to expand or till the end is reached
-        while current_node.n_empty != 0:
-
-            if current_node.unmade_moves != []:
-                return current_node.expand()
-            else:
-                current_node = current_node.UCT(C)
-
-        return None
+        path = np.array(path)
+        self.visits[path] += count
+        self.values[path] += result
 
 
 class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
@@ -200,36 +143,85 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         all_moves,
     ):
         """
-            This is the monte carlo function that repeats the monte carlo steps 109000 times if there is time left.
+            This is the monte carlo function that repeats the monte carlo steps N_simulations times if there is time
+            left. Every simulation selects a path with UCT, expands a node and plays random moves until the game ends,
+            on the board of game_state. All moves are undone afterwards.
 
-            @param gameCopy: The state of the game.
+            @param game_state: The state of the game.
             @param all_moves: List of all moves that needs investigation.
         """
-
-        gameCopy = game_state
-
-        N = game_state.board.N
-        empty_squares = set([(i, j) for i in range(N) for j in range(N) if gameCopy.board.get(i, j) == SudokuBoard.empty])
-
-        root = MCST_Node( all_moves, gameCopy, len(empty_squares), depth=0)
+        # Keep incremental row/column/block bookkeeping, so legality and scoring are constant time
+        board = BitSudokuBoard.from_board(game_state.board)
+        game_state.board = board
+        N = board.N
+        region_scores = GameState.region_scores
+        moves_table = move_table(N)
+        peers = peer_table(board.m, board.n)
+
+        # The results are score differences of the player to move at the root, relative to the current scores
+        player = game_state.current_player() - 1
+        initial_score = game_state.scores[player] - game_state.scores[1 - player]
+        n_empty = len(game_state.empty_squares)
+
+        tree = MCST_Tree([(move.i * N + move.j) * N + move.value - 1 for move in all_moves], peers)
+        engine = RolloutEngine(board.m, board.n) if ROLLOUTS > 1 else None
+        best_move = None
 
         for i in range(N_simulations):
 
-            # Selection step
-            nextMove = root.select_best_child()
-
-            if nextMove == None:
-                break
-            
-            # Simulation (roll out) step
-            result = nextMove.roll_out()
+            # Selection and expansion step
+            node = 0
+            path = [0]
+            moves = tree.moves[0]
+            while True:
+                if tree.expanded[node] < len(moves):
+                    node = tree.expand(node, moves)
+                    path.append(node)
+                    code = int(tree.move[node])
+                    game_state.push(moves_table[code])
+                    moves = peers.update_codes(moves, code)
+                    break
+                if not moves:
+                    break
+                node = tree.UCT(node, C)
+                path.append(node)
+                game_state.push(moves_table[int(tree.move[node])])
+                moves = tree.node_moves(node)
+            depth = len(path) - 1
+
+            # Simulation (roll out) step. The score difference is accumulated from the point of view of the player at
+            # the root. A finished game counts its score, a game that ends in an unsolvable position counts 0.
+            score = game_state.scores[player] - game_state.scores[1 - player] - initial_score
+            sign = -1 if depth % 2 else 1
+            if engine is not None:
+                scores, finished = engine.rollouts(board, moves, ROLLOUTS)
+                result = int(np.where(finished, score + sign * scores, 0).sum())
+            else:
+                # The moves are put on the board directly
+                played = []
+                while moves:
+                    code = random.choice(moves)
+                    i, j = divmod(code // N, N)
+                    empty_row, empty_column, empty_block = board.region_empty_counts(i, j)
+                    score += sign * region_scores[(empty_row == 1) + (empty_column == 1) + (empty_block == 1)]
+                    sign = -sign
+                    board.put(i, j, code % N + 1)
+                    played.append((i, j))
+                    moves = peers.update_codes(moves, code)
+                result = score if depth + len(played) == n_empty else 0
+                for i, j in played:
+                    board.put(i, j, SudokuBoard.empty)
+            for _ in range(depth):
+                game_state.pop()
 
             # Backpropogate step
-            nextMove.backpropagate(result)
+            tree.backpropagate(path, result, ROLLOUTS)
 
             # Getting best move to propose
-            best_move = root.UCT(C=0).move
-            self.propose_move(best_move)
+            code = int(tree.move[tree.UCT(0, C=0)])
+            if code != best_move:
+                best_move = code
+                self.propose_move(moves_table[code])
   
 
     def possible(self, i, j, value, game_state):
@@ -268,35 +260,6 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 ######                                    ######
 
 
-def update_moves(all_moves: list, current_i: int, current_j: int, current_value):
-    """
-    Updates the list of moves by creating a new list that doesn't include the illegal moves that are
-    generated after applying a move.
-
-    @param all_moves: List of all moves
-    @param current_i: Row coordinate of the move
-    @param current_j: Column coordinate of the move
-    @param current_value: Value of the current move
-    """
-
-    new_moves = []
-
-    for other_move in all_moves:
-        if (other_move.i, other_move.j) != (current_i, current_j):
-
-            if other_move.i != current_i and other_move.j != current_j:
-                new_moves.append(other_move)
-
-            elif (other_move.i == current_i and other_move.j != current_j) or (
-                other_move.i != current_i and other_move.j == current_j
-            ):
-
-                if other_move.value != current_value:
-                    new_moves.append(other_move)
-
-    return new_moves
-
-
 def score_move(move: Move, game_state: GameState) -> int:
     """The move scoring function calculates if a player will get contributed points
     for a given move. If either a block, column or row is completed 1 point is awarded
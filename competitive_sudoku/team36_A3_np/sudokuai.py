@@ -3,13 +3,45 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import random
+from functools import partial
 import numpy as np
-from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, TabooMove
+from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, move_table, zobrist_keys
 import competitive_sudoku.sudokuai
+from competitive_sudoku.candidates import CandidateTracker
+from competitive_sudoku.movelist import encode_move
+from competitive_sudoku.ordering import MoveOrdering
+from competitive_sudoku.peers import peer_table
+from competitive_sudoku.timemanager import TimeManager
+from competitive_sudoku.transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, taboo_moves_key
 
 MAX_DEPTH = 50
 END_GAME = 21
 
+# Fill in naked and hidden singles when checking if a position in the end game is unsolvable. This finds dead ends
+# earlier, but in our measurements the extra work per node costs more time than it saves.
+PROPAGATE_SINGLES = False
+
+# Nodes with at least ORDERING_DEPTH plies to search order their moves with killer moves and the history heuristic.
+# The other nodes keep the order in which the moves are generated, which gave smaller searches in our measurements.
+ORDERING_DEPTH = 2
+
+# Search the moves after the first one with a null window, and only search them again with the full window if they
+# are better (principal variation search)
+PRINCIPAL_VARIATION_SEARCH = True
+
+# Every iteration starts with a window of ASPIRATION_WINDOW around the evaluation of the previous iteration, and
+# searches again with the full window if the evaluation falls outside. 0 searches with the full window.
+ASPIRATION_WINDOW = 1
+
+# An iteration is only started if at least TIME_CONFIDENCE times its predicted duration is left before the deadline of
+# the move. Otherwise the move is proposed right away, since an unfinished iteration does not improve it. 0 starts
+# every iteration, until the player is stopped.
+TIME_CONFIDENCE = 0.5
+
+# Zobrist keys for the player to move and for taboo detection, which are combined with the hash of the board
+MIN_PLAYER_KEY = 0x9E3779B97F4A7C15
+TABOO_KEY = 0xC2B2AE3D27D4EB4F
+
 
 class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
     """
@@ -23,16 +55,38 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 
         self.taboo_moves = []
 
+        self.transposition_table = TranspositionTable()
+
+        # The killer moves and history scores of the interior nodes, it is created for the board size of the game
+        self.move_ordering = None
+
     def compute_best_move(self, game_state: GameState) -> None:
 
         N = game_state.board.N
 
+        # Forget the results of the previous turn, the player may be kept alive between moves
+        self.last_moves = []
+        self.taboo_moves = []
+
         self.board = np.reshape(game_state.board.squares, (N,N) )
 
-        # Find all legal and non taboo moves
-        all_moves = [Move(i, j, value) for i in range(N) for j in range(N) 
-                     for value in self.get_values(i, j, game_state) if self.possible(i, j, value, game_state)
-                    ]
+        # The Zobrist hash of self.board and the taboo moves of the game, it is updated together with the board during
+        # the search
+        self.N = N
+        self.zobrist = zobrist_keys(N)
+        self.peers = peer_table(game_state.board.m, game_state.board.n)
+        self.hash = game_state.board.hash ^ taboo_moves_key(game_state.board, game_state.taboo_moves)
+        self.transposition_table.new_search()
+        if self.move_ordering is None or self.move_ordering.N != N:
+            self.move_ordering = MoveOrdering(N, encode=partial(encode_move, N=N))
+        self.move_ordering.new_search()
+
+        # Find all legal and non taboo moves, using the legality of all squares and values at once
+        m, n = game_state.board.m, game_state.board.n
+        legal = legal_moves_tensor(self.board, m, n)
+        for move in game_state.taboo_moves:
+            legal[move.i, move.j, move.value - 1] = False
+        all_moves = moves_from_tensor(legal)
 
 
         # Propose a random move first in case there is no time to implement minimax.
@@ -42,20 +96,21 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 
 
         # Initial ordering based on if three completions can be made
-        moves = []
-        for move in all_moves:
-            if three_completions(move.i, move.j, game_state, self.board):
-                moves.insert(0, move)
-            else:
-                moves.append(move)
+        completed = region_completions(self.board, m, n) == 3
+        moves = [move for move in reversed(all_moves) if completed[move.i, move.j]] + \
+                [move for move in all_moves if not completed[move.i, move.j]]
 
-        empty_squares = set([(i, j) for i in range(N) for j in range(N) if self.board[i, j] == SudokuBoard.empty])
+        empty_squares = set(zip(*(index.tolist() for index in np.nonzero(self.board == SudokuBoard.empty))))
 
         # Start with depth 1 and then increase depth. For every depth, call minimax and propose a move. The more time we have
         # the most accurate the move that the minimax returns
+        time_manager = TimeManager(self.deadline, TIME_CONFIDENCE)
         for i in range(1, MAX_DEPTH):
             if i > len(empty_squares):
                 break
+            # Stop if the next iteration is not expected to finish before the deadline
+            if not time_manager.can_start_iteration():
+                break
 
             # Calculate taboo moves if you are in the end game
             if len(empty_squares) < END_GAME and i > 2:
@@ -63,8 +118,26 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
             else:
                 taboo = False
 
-            best_move, eval = self.minimax(game_state, i, float("-inf"), float("inf"), True, 0, empty_squares, moves, True, taboo)
-            
+            # The candidates of the empty squares, which are updated together with empty_squares during the search.
+            # Only the root moves that were not found to be taboo are candidates.
+            self.candidates = CandidateTracker(m, n, (encode_move(move, N) for move in moves),
+                                               [row * N + column for row, column in empty_squares])
+
+            time_manager.start_iteration()
+            if ASPIRATION_WINDOW and i > 1 and eval != 999:
+                # Search with a window around the previous evaluation, and with the full window if the evaluation falls
+                # outside. The root results of the failed search are forgotten.
+                taboo_moves_count = len(self.taboo_moves)
+                alpha, beta = eval - ASPIRATION_WINDOW, eval + ASPIRATION_WINDOW
+                best_move, eval = self.minimax(game_state, i, alpha, beta, True, 0, empty_squares, moves, True, taboo)
+                if best_move is None or not alpha < eval < beta:
+                    self.last_moves = []
+                    del self.taboo_moves[taboo_moves_count:]
+                    best_move, eval = self.minimax(game_state, i, float("-inf"), float("inf"), True, 0, empty_squares, moves, True, taboo)
+            else:
+                best_move, eval = self.minimax(game_state, i, float("-inf"), float("inf"), True, 0, empty_squares, moves, True, taboo)
+            time_manager.end_iteration()
+
             self.propose_move(best_move)
 
             # Determine if taboo move should be made and propose it.
@@ -80,39 +153,6 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
             moves = self.update_best_ordering()
 
 
-    def possible(self, i, j, value, game_state):
-        """
-        Checks if a move is possible to make by looking
-        if it is neither a taboo move nor an already filled square.
-
-        @param i: Row coordinate of the square
-        @param j: Column coordinate of the square
-        @param value: Value to be filled in
-        """
-
-        not_taboo = (
-            self.board[i, j] == SudokuBoard.empty
-            and not TabooMove(i, j, value) in game_state.taboo_moves
-        )
-        
-        return not_taboo
-
-    def get_values(self, i, j, game_state):
-        """
-        Determines for a square what kind of values can still be filled in.
-
-        @param i: Row coordinate of the square
-        @param j: Column coordinate of the square
-        """
-
-        N = game_state.board.N
-
-        values = get_surrounding_values(i, j, game_state, self.board)
-
-        return [value for value in range(1, N + 1) if value not in values]
-
-
-
     def minimax(
         self,
         game_state: GameState,
@@ -125,6 +165,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         all_moves: list,
         initial=False,
         taboo=False,
+        ply=0,
     ):
         """
         The minimax algorithm creates a tree with nodes that includes the current evaluation score of every
@@ -141,11 +182,42 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         @param all_moves: List of all moves that needs investigation.
         @param initial: Indicates if it's the initial state of the game or not.
         @param taboo: Indicates if it's taboo move or not.
+        @param ply: The distance of the node from the root.
         """
         # Return the current score if the depth level equals to 0 or if there are no other moves
         if depth == 0 or len(all_moves) == 0:
             return None, current_score
 
+        # Look up the position in the transposition table. Positions are often reached by different move orders.
+        alpha_start, beta_start = alpha, beta
+        key = self.hash
+        if not isMaximisingPlayer:
+            key ^= MIN_PLAYER_KEY
+        if taboo:
+            key ^= TABOO_KEY
+        entry = None if initial else self.transposition_table.lookup(key)
+        hash_move = None
+        if entry is not None:
+            _, entry_depth, bound, value, hash_move, _ = entry
+            if entry_depth >= depth:
+                value += current_score
+                if bound == EXACT:
+                    return hash_move, value
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return hash_move, value
+
+        # Search the best move of an earlier search first, then the killer moves of the ply and the moves with the best
+        # history. The root moves are ordered by the previous iteration.
+        if not initial:
+            if depth >= ORDERING_DEPTH:
+                all_moves = self.move_ordering.order(all_moves, ply, hash_move)
+            elif hash_move is not None and hash_move in all_moves:
+                all_moves = [hash_move] + [move for move in all_moves if move != hash_move]
+
         taboo_count = 0
 
 
@@ -162,12 +234,13 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 move_score = score_move(move, game_state, self.board)
 
                 # Update moves
-                new_moves = update_moves(all_moves, move.i, move.j, move.value)
+                new_moves = self.peers.update_moves(all_moves, move.i, move.j, move.value)
 
                 # Remove this move from the empty squared table
                 empty_squares.remove((move.i, move.j))
+                self.candidates.push((move.i * self.N + move.j) * self.N + move.value - 1)
 
-                if taboo and unsolvable(empty_squares, new_moves):
+                if taboo and self.candidates.unsolvable(PROPAGATE_SINGLES):
 
                     if initial:
                         if move not in self.taboo_moves:
@@ -177,6 +250,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                         taboo_count += 1
 
                     empty_squares.add((move.i, move.j))
+                    self.candidates.pop()
 
                     continue
 
@@ -186,29 +260,48 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 # Add the move on the board
 
                 self.board[move.i, move.j] = move.value
+                self.hash ^= self.zobrist[(move.i * self.N + move.j) * self.N + move.value - 1]
 
                 # Call the minimax function. Decrease the depth and indicate that since this player is the Max the other
-                # player should be the Min (False). Save the result in the current_eval attribute.
+                # player should be the Min (False). Save the result in the current_eval attribute. Once a move has been
+                # evaluated, the other moves are first tested with a null window.
+                null_window = PRINCIPAL_VARIATION_SEARCH and max_eval > float("-inf")
                 current_eval = self.minimax(
                     game_state,
                     depth - 1,
                     alpha,
-                    beta,
+                    alpha + 1 if null_window else beta,
                     False,
                     current_score,
                     empty_squares,
                     new_moves,
                     taboo=taboo,
+                    ply=ply + 1,
                 )[1]
+                if null_window and alpha < current_eval < beta and current_eval != 999:
+                    current_eval = self.minimax(
+                        game_state,
+                        depth - 1,
+                        alpha,
+                        beta,
+                        False,
+                        current_score,
+                        empty_squares,
+                        new_moves,
+                        taboo=taboo,
+                        ply=ply + 1,
+                    )[1]
        
                 # Subtract the move score from current score
                 current_score -= move_score
 
                 # Add the move score from the empty table
                 empty_squares.add((move.i, move.j))
+                self.candidates.pop()
 
                 # Remove the move score from the board
                 self.board[move.i, move.j] = SudokuBoard.empty
+                self.hash ^= self.zobrist[(move.i * self.N + move.j) * self.N + move.value - 1]
 
                 # game_state.board.put(move.i, move.j, SudokuBoard.empty)
                 
@@ -235,11 +328,15 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 if max_eval >= beta:
                     if initial:
                         self.last_moves.append([current_eval, move])
+                    self.move_ordering.cutoff(move, ply, depth)
                     break
 
             if taboo_count == len(all_moves):
                 return None, 999
 
+            if not initial:
+                self.store(key, depth, max_eval, current_score, best_move, alpha_start, beta_start)
+
             # Return the best move and its evaluation score
             return best_move, max_eval
 
@@ -252,13 +349,15 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 
                 # Remove this move from the empty squared table
                 empty_squares.remove((move.i, move.j))
+                self.candidates.push((move.i * self.N + move.j) * self.N + move.value - 1)
 
                 # Update moves
-                new_moves = update_moves(all_moves, move.i, move.j, move.value)
+                new_moves = self.peers.update_moves(all_moves, move.i, move.j, move.value)
 
-                if taboo and unsolvable(empty_squares, new_moves):
+                if taboo and self.candidates.unsolvable(PROPAGATE_SINGLES):
                     taboo_count += 1
                     empty_squares.add((move.i, move.j))
+                    self.candidates.pop()
 
                     continue
 
@@ -271,31 +370,50 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 # Add the move on the board
                 # game_state.board.put(move.i, move.j, move.value)
                 self.board[move.i, move.j] =  move.value
+                self.hash ^= self.zobrist[(move.i * self.N + move.j) * self.N + move.value - 1]
 
 
                 # Call the minimax function. Decrease the depth and indicate that since this player is the Min the other
-                # player should be the Max (True). Save the result in the current_eval attribute.
+                # player should be the Max (True). Save the result in the current_eval attribute. Once a move has been
+                # evaluated, the other moves are first tested with a null window.
+                null_window = PRINCIPAL_VARIATION_SEARCH and min_eval < float("inf")
                 current_eval = self.minimax(
                     game_state,
                     depth - 1,
-                    alpha,
+                    beta - 1 if null_window else alpha,
                     beta,
                     True,
                     current_score,
                     empty_squares,
                     new_moves,
                     taboo=taboo,
+                    ply=ply + 1,
                 )[1]
+                if null_window and alpha < current_eval < beta and current_eval != 999:
+                    current_eval = self.minimax(
+                        game_state,
+                        depth - 1,
+                        alpha,
+                        beta,
+                        True,
+                        current_score,
+                        empty_squares,
+                        new_moves,
+                        taboo=taboo,
+                        ply=ply + 1,
+                    )[1]
 
                 # Add the score of the move in the current score
                 current_score += move_score
 
                 # Add the move score to the empty table
                 empty_squares.add((move.i, move.j))
+                self.candidates.pop()
 
                 # Remove the move score from the board
                 # game_state.board.put(move.i, move.j, SudokuBoard.empty)
                 self.board[move.i, move.j] = SudokuBoard.empty
+                self.hash ^= self.zobrist[(move.i * self.N + move.j) * self.N + move.value - 1]
 
                 if float(current_eval) == 999:
                     taboo_count += 1
@@ -310,6 +428,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
                 # evaluation score there is no need to investigate the tree further
                 beta = min(beta, min_eval)
                 if min_eval <= alpha:
+                    self.move_ordering.cutoff(move, ply, depth)
                     break
 
             # If there
@@ -317,9 +436,33 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
             if taboo_count == len(all_moves):
                 return None, 999
 
+            if not initial:
+                self.store(key, depth, min_eval, current_score, best_move, alpha_start, beta_start)
+
             # Return the best move and its evaluation score
             return best_move, min_eval
 
+    def store(self, key, depth, value, current_score, move, alpha, beta):
+        """
+        Stores the result of a search in the transposition table. The value is stored relative to the score at the
+        position, such that it does not depend on the moves that were played to reach the position.
+
+        @param key: Hash of the position
+        @param depth: The depth of the search
+        @param value: The evaluation score of the position
+        @param current_score: The current evaluation score of the game at the position
+        @param move: The best move in the position
+        @param alpha: The value of alpha at the start of the search
+        @param beta: The value of beta at the start of the search
+        """
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transposition_table.store(key, depth, bound, value - current_score, move)
+
 
     def update_best_ordering(self):
         """ 
@@ -370,57 +513,6 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
 #       INFORMATION ON THE MOVES               #
 ######                                    ######
 
-def update_moves(all_moves, current_i: int, current_j: int, current_value):
-    """
-    Updates the list of moves by creating a new list that doesn't include the illegal moves that are
-    generated after applying a move.
-
-    @param all_moves: List of all moves
-    @param current_i: Row coordinate of the move
-    @param current_j: Column coordinate of the move
-    @param current_value: Value of the current move
-    """
-
-    new_moves = []
-
-    for other_move in all_moves:
-        if (other_move.i, other_move.j) != (current_i, current_j):
-
-            if other_move.i != current_i and other_move.j != current_j:
-                new_moves.append(other_move)
-
-            elif (other_move.i == current_i and other_move.j != current_j) or (
-                other_move.i != current_i and other_move.j == current_j
-            ):
-
-                if other_move.value != current_value:
-                    new_moves.append(other_move)
-
-    return new_moves
-
-
-def unsolvable(empty_squares, moves):
-    """
-    Check if any empty square does not have any moves to be made
-
-    @param empty_squares: List of empty squares
-    @param moves: List of moves
-    """
-
-    for square_i, square_j in empty_squares:
-        solutions = 0
-
-        for move in moves:
-
-            if move.i == square_i and move.j == square_j:
-                solutions += 1
-
-        if solutions == 0:
-            return True
-
-    return False
-
-
 def score_move(move: Move, game_state: GameState, board) -> int:
     """The move scoring function calculates if a player will get contributed points
     for a given move. If either a block, column or row is completed 1 point is awarded
@@ -450,72 +542,87 @@ def score_move(move: Move, game_state: GameState, board) -> int:
 #       INFORMATION ON THE BOARD STATUS        #
 ######                                    ######
 
-def completions(i, j, game_state: GameState, board):
+def legal_moves_tensor(board, m, n):
     """
-    Returns true if a move completes a row a column and a block.
+    Determines for every square and every value if the value can be filled in, using vectorized operations on the
+    whole board.
 
-    @param i: Row coordinate of the move
-    @param j: Column coordinate of the move
-    @param game_state: Current state of the game
-    
+    @param board: The board as an N x N array
+    @param m: The number of rows in a block
+    @param n: The number of columns in a block
+    @return: Boolean array of shape (N, N, N), where entry [i, j, value - 1] tells if value can be put on square (i, j)
     """
+    N = m * n
 
-    complete_row = len(set(get_row(i, game_state, board))) == game_state.board.N 
-    complete_column = len(set(get_column(j, game_state, board))) == game_state.board.N
-    complete_box = len(set(get_block(i, j, game_state, board))) == game_state.board.N
+    # one_hot[i, j, value - 1] is True if square (i, j) contains value
+    one_hot = board[:, :, None] == np.arange(1, N + 1)
 
-    return complete_row, complete_column, complete_box
+    row_used = one_hot.any(axis=1)
+    column_used = one_hot.any(axis=0)
+
+    # The blocks are found by splitting the rows in n bands of m rows, and the columns in m stacks of n columns
+    block_used = one_hot.reshape(n, m, m, n, N).any(axis=(1, 3))
+    block_used = block_used.repeat(m, axis=0).repeat(n, axis=1)
 
-def three_completions(i, j, game_state: GameState, board):
+    return (board == SudokuBoard.empty)[:, :, None] & ~row_used[:, None, :] & ~column_used[None, :, :] & ~block_used
+
+
+def region_empty_counts(board, m, n):
     """
-    Returns true if a move completes a row a column and a block.
+    Counts for every square the number of empty squares in its row, column and block.
 
-    @param i: Row coordinate of the move
-    @param j: Column coordinate of the move
-    @param game_state: Current state of the game
+    @param board: The board as an N x N array
+    @param m: The number of rows in a block
+    @param n: The number of columns in a block
+    @return: Three integer arrays of shape (N, N) with the counts of the rows, columns and blocks
     """
-    complete_row, complete_column, complete_box = completions(i, j, game_state, board)
+    N = m * n
+    empty = board == SudokuBoard.empty
+    row_empty = np.broadcast_to(empty.sum(axis=1)[:, None], (N, N))
+    column_empty = np.broadcast_to(empty.sum(axis=0)[None, :], (N, N))
+    block_empty = empty.reshape(n, m, m, n).sum(axis=(1, 3)).repeat(m, axis=0).repeat(n, axis=1)
+    return row_empty, column_empty, block_empty
 
-    if complete_row and complete_column and complete_box:
-        return True
-    else:
-        return False
 
-def get_surrounding_values(i: int, j: int, game_state: GameState, board):
+def region_completions(board, m, n):
     """
-    Retrieve which values are in the block, row and column of
-    a given square.
-
-    Parameters:
-            i: Row coordinate of the square
-            j: Column coordinate of the square
-            game_state: The current game state (board)
+    Counts for every square how many regions (row, column and block) are completed by filling it in.
 
-        Returns:
-            values: the values in the block, row, column surrounding a square
+    @param board: The board as an N x N array
+    @param m: The number of rows in a block
+    @param n: The number of columns in a block
+    @return: Integer array of shape (N, N) with values in the range [0, 3]
     """
+    row_empty, column_empty, block_empty = region_empty_counts(board, m, n)
+    return (row_empty == 1).astype(int) + (column_empty == 1) + (block_empty == 1)
 
-    values = set()
 
-    # Get values in row
-    values.update(get_row(i, game_state, board))
-    
+def moves_from_tensor(legal):
+    """
+    Converts a legality tensor into a list of moves, ordered by row, column and value. The flat index of (i, j, value - 1)
+    in the tensor is the index of the move in the interned move table, so no new moves are allocated.
 
-    # Get values in column
-    values.update(get_column(j, game_state, board))
-    if len(values) == game_state.board.N + 1:
-        if 0 in values:
-            values.remove(0)
-        return values
+    @param legal: Boolean array of shape (N, N, N), as returned by legal_moves_tensor
+    """
+    moves = move_table(legal.shape[0])
+    return [moves[index] for index in np.flatnonzero(legal).tolist()]
 
-    # Get values in block
-    values.update(get_block(i, j, game_state, board))
 
-    if 0 in values:
-        values.remove(0)
+def completions(i, j, game_state: GameState, board):
+    """
+    Returns true if a move completes a row a column and a block.
 
-    return values
+    @param i: Row coordinate of the move
+    @param j: Column coordinate of the move
+    @param game_state: Current state of the game
+    
+    """
+
+    complete_row = len(set(get_row(i, game_state, board))) == game_state.board.N 
+    complete_column = len(set(get_column(j, game_state, board))) == game_state.board.N
+    complete_box = len(set(get_block(i, j, game_state, board))) == game_state.board.N
 
+    return complete_row, complete_column, complete_box
 
 def get_column(j: int, game_state: GameState, board):
     """Retrieve the values in a certain column with coordinate j
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import itertools
+import os
+import pickle
+import platform
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from competitive_sudoku.sudoku import load_sudoku_from_text
+from simulate_game import simulate_game
+
+
+def schedule_games(agents, boards, times, rounds, seed):
+    """
+    Creates the games of a round robin tournament. Every pair of agents plays on every board with every time budget,
+    once with each agent moving first, and this is repeated rounds times.
+    @param agents: The module names of the agents.
+    @param boards: The file names of the start positions.
+    @param times: The calculation times in seconds.
+    @param rounds: The number of repetitions.
+    @param seed: The seed from which the seeds of the games are derived.
+    @return: A list of games (index, first, second, board, time, seed).
+    """
+    generator = random.Random(seed)
+    games = []
+    for agent1, agent2 in itertools.combinations(agents, 2):
+        for board, calculation_time, _ in itertools.product(boards, times, range(rounds)):
+            for first, second in ((agent1, agent2), (agent2, agent1)):
+                games.append((len(games), first, second, board, calculation_time, generator.getrandbits(32)))
+    return games
+
+
+def load_player(module_name: str, solve_sudoku_path):
+    """
+    Creates the SudokuAI of a module.
+    @param module_name: The module name of the SudokuAI class.
+    @param solve_sudoku_path: The location of the oracle, for the players that use it.
+    @return: The created SudokuAI.
+    """
+    module = importlib.import_module(module_name + '.sudokuai')
+    player = module.SudokuAI()
+    if hasattr(player, 'solve_sudoku_path'):
+        player.solve_sudoku_path = solve_sudoku_path
+    return player
+
+
+def play_game(game, solve_sudoku_path, persistent: bool = False):
+    """
+    Plays one game of the tournament. The output of simulate_game is suppressed.
+    @param game: A game (index, first, second, board, time, seed) as created by schedule_games.
+    @param solve_sudoku_path: The location of the oracle executable, or None for the in-process oracle.
+    @param persistent: If True, the players run in long-lived worker processes.
+    @return: The game followed by the result of simulate_game: 1 if the first player wins, -1 if the second player
+    wins and 0 in case of a draw.
+    """
+    index, first, second, board_file, calculation_time, seed = game
+    random.seed(seed)
+    try:
+        import numpy
+        numpy.random.seed(seed)
+    except ImportError:
+        pass
+    board = load_sudoku_from_text(Path(board_file).read_text())
+    player1 = load_player(first, solve_sudoku_path)
+    player2 = load_player(second, solve_sudoku_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path,
+                               calculation_time=calculation_time, persistent=persistent)
+    return game + (result,)
+
+
+def print_summary(results) -> None:
+    """
+    Prints the number of wins, draws and losses of every agent, in total and per opponent, board and time.
+    @param results: The games returned by play_game.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    details = defaultdict(lambda: [0, 0, 0])
+    for _, first, second, board, calculation_time, _, result in results:
+        for agent, opponent, outcome in ((first, second, result), (second, first, -result)):
+            column = {1: 0, 0: 1, -1: 2}[outcome]
+            totals[agent][column] += 1
+            details[agent, opponent, board, calculation_time][column] += 1
+
+    print(f'{"agent":<30} {"win":>5} {"draw":>5} {"loss":>5}')
+    for agent, (win, draw, loss) in sorted(totals.items(), key=lambda item: (-item[1][0], item[1][2])):
+        print(f'{agent:<30} {win:>5} {draw:>5} {loss:>5}')
+    print()
+    print(f'{"agent":<25} {"opponent":<25} {"board":<20} {"time":>5} {"win":>5} {"draw":>5} {"loss":>5}')
+    for (agent, opponent, board, calculation_time), (win, draw, loss) in sorted(details.items()):
+        print(f'{agent:<25} {opponent:<25} {Path(board).name:<20} {calculation_time:>5} {win:>5} {draw:>5} {loss:>5}')
+
+
+def main():
+    solve_sudoku_path = 'bin\\solve_sudoku.exe' if platform.system() == 'Windows' else 'bin/solve_sudoku'
+
+    cmdline_parser = argparse.ArgumentParser(description='Script for running a competitive sudoku tournament on multiple cores.')
+    cmdline_parser.add_argument('--agents', nargs='+', help="the module names of the SudokuAI classes", required=True)
+    cmdline_parser.add_argument('--boards', nargs='+', metavar='FILE', help="the start positions (default: boards/*.txt)", default=sorted(glob.glob('boards/*.txt')))
+    cmdline_parser.add_argument('--time', nargs='+', type=float, help="the times (in seconds) for computing a move (default: 0.5)", default=[0.5])
+    cmdline_parser.add_argument('--rounds', type=int, help="the number of times every game is played (default: 1)", default=1)
+    cmdline_parser.add_argument('--workers', type=int, help="the number of games that are played in parallel (default: the number of CPU cores)", default=os.cpu_count())
+    cmdline_parser.add_argument('--seed', type=int, help="the seed for the random generators of the games (default: 0)", default=0)
+    cmdline_parser.add_argument('--persistent', help="run every player in a long-lived worker process instead of a new process per move", action='store_true')
+    cmdline_parser.add_argument('--python-oracle', help="use the in-process python oracle instead of the solve_sudoku program", action='store_true')
+    cmdline_parser.add_argument('--output', metavar='FILE', help="a file to which the results are pickled")
+    args = cmdline_parser.parse_args()
+
+    if args.python_oracle:
+        solve_sudoku_path = None
+
+    games = schedule_games(args.agents, args.boards, args.time, args.rounds, args.seed)
+    print(f'Playing {len(games)} games on {args.workers} workers')
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(play_game, game, solve_sudoku_path, args.persistent) for game in games]
+        for future in as_completed(futures):
+            index, first, second, board, calculation_time, _, result = future.result()
+            results.append(future.result())
+            outcome = {1: f'{first} wins', 0: 'draw', -1: f'{second} wins'}[result]
+            print(f'[{len(results)}/{len(games)}] {first} - {second} on {board} ({calculation_time}s): {outcome}')
+    results.sort()
+
+    print()
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'wb') as file:
+            pickle.dump(results, file)
+
+
+if __name__ == '__main__':
+    main()